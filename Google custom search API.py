@@ -1,7 +1,10 @@
 import os
-import time
+import asyncio
 import requests
 from datetime import datetime
+from retry_helper import retryable, is_retryable, log_retry
+from blood_delivery import push_records, close_all
+from key_pool import KeyPool, KeyPoolExhausted, error_reasons, rotates_key
 
 # === Configuration ===
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -14,61 +17,77 @@ KEYWORDS = [
     "NVIDIA", "Midjourney", "LLM fine-tuning"
 ]
 
-# Rate limit delay (seconds)
-DELAY_BETWEEN_REQUESTS = 2
+REQUEST_TIMEOUT = 15
+
+# Keys from config/api_keys.json (plus GOOGLE_API_KEY); each key is paced
+# by its own token bucket instead of a fixed delay between requests
+key_pool = KeyPool.from_config("google_search", fallback=[GOOGLE_API_KEY])
 
 # === Helper Functions ===
-def fetch_google_results(query):
-    """Fetch search results for a query from Google Custom Search."""
+class KeyRejected(requests.exceptions.HTTPError):
+    """The key was throttled, exhausted or invalid; another key may succeed."""
+
+def _retry_search(exc):
+    return isinstance(exc, KeyRejected) or is_retryable(exc)
+
+@retryable(max_attempts=3, base_delay=0.5, deadline=45, retry_on=_retry_search, on_retry=log_retry)
+def _get_google_results(query):
     url = "https://www.googleapis.com/customsearch/v1"
+    key = key_pool.acquire()
     params = {
-        'key': GOOGLE_API_KEY,
+        'key': key,
         'cx': CUSTOM_SEARCH_ENGINE_ID,
         'q': query
     }
+    response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    if response.status_code in (400, 403, 429):
+        # Rest throttled/exhausted/invalid keys so the retry is routed to another one
+        reasons = error_reasons(response)
+        key_pool.report(key, response.status_code, reasons)
+        if response.status_code == 429 or rotates_key(reasons):
+            raise KeyRejected(f"{response.status_code} {reasons} for query '{query}'", response=response)
+    response.raise_for_status()
+    return response.json()
 
+def fetch_google_results(query):
+    """Fetch search results for a query from Google Custom Search."""
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        results = response.json()
+        results = _get_google_results(query)
         items = results.get('items', [])
         return items
     except requests.exceptions.RequestException as e:
         print(f"[❌] Request failed for '{query}': {e}")
         return []
+    except KeyPoolExhausted as e:
+        print(f"[⚠️] Skipping '{query}': {e}")
+        return []
 
-def post_to_blood(item, keyword):
-    """Send a single search result to blood API."""
-    payload = {
+async def post_to_blood(items, keyword):
+    """Queue a keyword's search results for batched delivery to blood API."""
+    fetched_at = datetime.utcnow().isoformat()
+    payloads = [{
         "title": item.get("title"),
         "link": item.get("link"),
         "keyword": keyword,
-        "fetched_at": datetime.utcnow().isoformat()
-    }
-
-    try:
-        response = requests.post(BLOOD_API_URL, json=payload)
-        if response.status_code == 200:
-            print(f"[✅] Sent to blood: {item.get('title')}")
-        else:
-            print(f"[⚠️] Blood API returned {response.status_code}: {response.text}")
-    except requests.exceptions.RequestException as e:
-        print(f"[❌] Failed to send to blood: {e}")
+        "fetched_at": fetched_at
+    } for item in items]
+    await push_records(BLOOD_API_URL, payloads)
+    print(f"[✅] Queued {len(payloads)} results for blood: {keyword}")
 
 # === Main Loop ===
-def main():
+async def main():
     for keyword in KEYWORDS:
         print(f"\n🔍 Fetching results for: {keyword}")
-        items = fetch_google_results(keyword)
+        items = await asyncio.to_thread(fetch_google_results, keyword)
 
         if not items:
             print(f"[⚠️] No results for: {keyword}")
             continue
 
-        for item in items:
-            post_to_blood(item, keyword)
+        await post_to_blood(items, keyword)
 
-        time.sleep(DELAY_BETWEEN_REQUESTS)
+    # Deliver remaining batches; anything Blood rejects is spooled for the next run
+    await close_all()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,8 +1,8 @@
 import requests
 from supabase import create_client
 from datetime import datetime
-import random
-import time
+from supabase_bulk import SupabaseBulkWriter
+from key_pool import KeyPool, KeyPoolExhausted, error_reasons, rotates_key
 
 # --- CONFIGURATION ---
 
@@ -20,22 +20,34 @@ TABLE_NAME = "trends"
 # --- INITIALIZATION ---
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+writer = SupabaseBulkWriter(SUPABASE_URL, SUPABASE_KEY)
+# Quota-aware rotation over config/api_keys.json plus the keys above
+key_pool = KeyPool.from_config("google_search", fallback=GOOGLE_API_KEYS)
 
 # --- FUNCTIONS ---
 
-def get_random_api_key():
-    if not GOOGLE_API_KEYS:
-        raise ValueError("[❌] No Google API keys configured!")
-    return random.choice(GOOGLE_API_KEYS)
+def get_api_key():
+    """Key with the most remaining quota, paced by its token bucket."""
+    return key_pool.acquire()
 
-def fetch_search_results(query):
+def fetch_search_results(query, attempts=3):
     url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": get_random_api_key(),
-        "cx": CUSTOM_SEARCH_ENGINE_ID,
-        "q": query
-    }
-    response = requests.get(url, params=params)
+    for _ in range(attempts):
+        key = get_api_key()
+        params = {
+            "key": key,
+            "cx": CUSTOM_SEARCH_ENGINE_ID,
+            "q": query
+        }
+        response = requests.get(url, params=params, timeout=15)
+        if response.status_code == 200:
+            break
+
+        reasons = error_reasons(response)
+        key_pool.report(key, response.status_code, reasons)
+        if response.status_code != 429 and not rotates_key(reasons):
+            break
+        print(f"[⚠️] Key rejected for '{query}' ({', '.join(reasons) or response.status_code}); trying another key")
 
     if response.status_code != 200:
         print(f"[❌] Google API error for '{query}': {response.text}")
@@ -45,23 +57,42 @@ def fetch_search_results(query):
     print(f"[✅] Fetched {len(items)} results for: '{query}'")
     return items
 
-def save_results_to_supabase(items, keyword):
-    for item in items:
-        data = {
-            "title": item.get("title"),
-            "link": item.get("link"),
-            "keyword": keyword,
-            "interest": None,
-            "fetched_at": datetime.utcnow().isoformat()
-        }
-
-        response = supabase.table(TABLE_NAME).insert(data).execute()
+CONFLICT_KEY = "keyword,link"
+
+def build_rows(items, keyword, fetched_at=None):
+    fetched_at = fetched_at or datetime.utcnow().isoformat()
+    return [{
+        "title": item.get("title"),
+        "link": item.get("link"),
+        "keyword": keyword,
+        "interest": None,
+        "fetched_at": fetched_at
+    } for item in items]
+
+def dedup_rows(rows):
+    """Keep the last row per (keyword, link) so one upsert never hits the same key twice."""
+    unique = {}
+    for row in rows:
+        unique[(row["keyword"], row["link"])] = row
+    return list(unique.values())
+
+def save_batch_to_supabase(rows):
+    """
+    Upsert a whole run's results in a few bulk writes keyed on (keyword, link).
+    Rows the database rejects are isolated and reported individually.
+    """
+    rows = dedup_rows(rows)
+    if not rows:
+        return {"written": 0, "failed": [], "errors": [], "row_errors": []}
+
+    result = writer.upsert(TABLE_NAME, rows, on_conflict=CONFLICT_KEY, isolate_failures=True)
+    for failure in result["row_errors"]:
+        print(f"[❌] Insert error for '{failure['row']['title']}': {failure['error']}")
+    print(f"[✅] Upserted {result['written']}/{len(rows)} results")
+    return result
 
-        # response object can differ, so check both possible ways:
-        if (hasattr(response, 'status_code') and response.status_code >= 300) or response.get("error"):
-            print(f"[❌] Insert error for '{data['title']}': {response.get('error')}")
-        else:
-            print(f"[✅] Inserted: {data['title']}")
+def save_results_to_supabase(items, keyword):
+    return save_batch_to_supabase(build_rows(items, keyword))
 
 def fetch_keywords_from_source():
     # Placeholder for dynamic keyword fetching (Google Trends, Twitter, etc.)
@@ -71,16 +102,21 @@ def fetch_keywords_from_source():
 
 if __name__ == "__main__":
     keywords = fetch_keywords_from_source()
+    pending = []
 
     for keyword in keywords:
         print(f"\n🔍 Searching: {keyword}")
         try:
             results = fetch_search_results(keyword)
             if results:
-                save_results_to_supabase(results, keyword)
+                pending.extend(build_rows(results, keyword))
             else:
                 print(f"[⚠️] No results for: {keyword}")
+        except KeyPoolExhausted as e:
+            print(f"[⚠️] Stopping sweep: {e}")
+            break
         except Exception as e:
             print(f"[❌] Error processing '{keyword}': {e}")
 
-        time.sleep(2)  # polite delay to avoid rate limits
+    # One bulk write for the whole sweep
+    save_batch_to_supabase(pending)
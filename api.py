@@ -1,21 +1,85 @@
-from fastapi import FastAPI
-from sqlalchemy.orm import sessionmaker
-from db import Article, engine
-from typing import List
+import os
+import json
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
+from db import fetch_articles_page, iter_articles, search_articles_fts, get_generation, InvalidCursor
+from response_cache import ResponseCache, cache_key, make_etag, etag_matches
+from redis_manager import init_redis
+from typing import Literal, Optional
+from datetime import datetime
 
 app = FastAPI()
-Session = sessionmaker(bind=engine)
+cache = ResponseCache()
 
-@app.get("/articles", response_model=List[dict])
-def get_articles(limit: int = 20):
-    session = Session()
-    rows = session.query(Article).order_by(Article.publish_date.desc()).limit(limit).all()
-    session.close()
-    return [row.__dict__ for row in rows]
+ArticleView = Literal["summary", "full"]
+
+@app.on_event("startup")
+async def connect_cache_backend():
+    # Optional shared cache tier
+    if os.getenv("UPSTASH_URL"):
+        await init_redis()
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor(request: Request, exc: InvalidCursor):
+    # Cursors are opaque; a tampered or truncated one is the client's error
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+async def cached_json(request: Request, compute):
+    """
+    Serve from cache (or 304) for the current articles generation; otherwise
+    run compute() -> (payload, headers) in the threadpool and cache it.
+    """
+    generation = await run_in_threadpool(get_generation)
+    key = cache_key(request, generation)
+    etag = make_etag(key)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    entry = await cache.get(key)
+    if entry is None:
+        payload, headers = await run_in_threadpool(compute)
+        entry = (json.dumps(payload).encode(), headers)
+        await cache.set(key, *entry)
+    body, headers = entry
+    return Response(content=body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": "no-cache", **headers})
+
+@app.get("/articles")
+async def get_articles(
+    request: Request,
+    limit: int = Query(20, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: ArticleView = "summary",
+):
+    """Newest first. The next page's cursor is returned in the X-Next-Cursor header."""
+    def compute():
+        rows, next_cursor = fetch_articles_page(view, limit, cursor)
+        return rows, ({"X-Next-Cursor": next_cursor} if next_cursor else {})
+    return await cached_json(request, compute)
+
+@app.get("/articles/stream")
+def stream_articles(view: ArticleView = "summary"):
+    """Whole archive as NDJSON, paged internally by keyset."""
+    lines = (json.dumps(row) + "\n" for row in iter_articles(view))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @app.get("/search")
-def search_articles(q: str):
-    session = Session()
-    rows = session.query(Article).filter(Article.clean_text.contains(q)).all()
-    session.close()
-    return [row.__dict__ for row in rows]
+async def search_articles(
+    request: Request,
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    keywords: Optional[str] = Query(None, description="comma-separated keywords that must all match"),
+):
+    """Best match first. Paged like /articles: the next cursor is in the X-Next-Cursor header."""
+    def compute():
+        results, next_cursor = search_articles_fts(
+            q, limit=limit, cursor=cursor, source=source, since=since, until=until,
+            keywords=keywords.split(",") if keywords else None,
+        )
+        return results, ({"X-Next-Cursor": next_cursor} if next_cursor else {})
+    return await cached_json(request, compute)
@@ -0,0 +1,53 @@
+# bench_startup.py
+"""
+Cold-start benchmark for each entry point.
+
+Imports every module in a fresh interpreter, reports wall-clock import time
+and which models (if any) were loaded as a side effect. Run from the repo
+root:  python bench_startup.py [module ...] [--runs N]
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ENTRY_POINTS = ["api", "db", "main", "rss_ingestor"]
+
+PROBE = """
+import time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+import model_registry
+print(json.dumps({{"seconds": elapsed, "models": model_registry.loaded_models()}}))
+"""
+
+
+def measure(module, runs):
+    timings, models = [], []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", PROBE.format(module=module)],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.strip().splitlines()[-1]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        models = result["models"]
+    return {"module": module, "median_s": statistics.median(timings), "min_s": min(timings), "models": models}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time per entry point")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        result = measure(module, args.runs)
+        if "error" in result:
+            print(f"{module:<14} failed: {result['error']}")
+        else:
+            print(f"{module:<14} median {result['median_s']:.3f}s  min {result['min_s']:.3f}s  "
+                  f"models loaded: {', '.join(result['models']) or 'none'}")
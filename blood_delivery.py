@@ -0,0 +1,225 @@
+# blood_delivery.py
+"""
+Batched delivery of records to the Blood endpoints.
+
+One pooled keep-alive client (HTTP/2 when h2 is installed) is shared by all
+sinks. Records are micro-batched per endpoint by count, size and age, sent
+as JSON ({"data": [...]}, same shape push_to_blood always used; gzip only
+with BLOOD_GZIP=1, once the receiver inflates request bodies) with bounded
+in-flight concurrency, and spilled to a local JSONL spool whenever Blood is
+slow or down. The spool is replayed on the next flush (one replay per sink at a time,
+at most BLOOD_MAX_REPLAY_BATCHES batches per flush) and a replay file is
+only deleted once its batches are delivered (or re-spooled). Batches Blood
+rejects with a non-retryable 4xx go to a dead-letter file instead.
+"""
+
+import os
+import re
+import contextlib
+import glob
+import gzip
+import json
+import time
+import asyncio
+import httpx
+
+from retry_helper import retry_async, is_retryable, get_status
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# -------------------------
+# Config
+# -------------------------
+BATCH_MAX_RECORDS = int(os.getenv("BLOOD_BATCH_MAX_RECORDS", 500))
+BATCH_MAX_BYTES = int(os.getenv("BLOOD_BATCH_MAX_BYTES", 512 * 1024))
+BATCH_MAX_AGE = float(os.getenv("BLOOD_BATCH_MAX_AGE", 2.0))  # seconds
+MAX_IN_FLIGHT = int(os.getenv("BLOOD_MAX_IN_FLIGHT", 4))
+MAX_PENDING_BATCHES = int(os.getenv("BLOOD_MAX_PENDING_BATCHES", 16))
+MAX_REPLAY_BATCHES = int(os.getenv("BLOOD_MAX_REPLAY_BATCHES", 20))  # per flush, so a backlog can't stall a cycle
+REQUEST_TIMEOUT = float(os.getenv("BLOOD_TIMEOUT", 15))
+USE_GZIP = os.getenv("BLOOD_GZIP", "0") == "1"  # receivers must inflate Content-Encoding: gzip
+SPOOL_DIR = os.getenv("BLOOD_SPOOL_DIR", "blood_spool")
+
+_client: httpx.AsyncClient = None
+_sinks = {}
+
+def get_client():
+    """Process-wide pooled client shared by every sink."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_IN_FLIGHT * 2, max_keepalive_connections=MAX_IN_FLIGHT),
+        )
+    return _client
+
+# -------------------------
+# Sink
+# -------------------------
+class BloodSink:
+    """Micro-batching sink for a single Blood endpoint."""
+
+    def __init__(self, endpoint, max_records=BATCH_MAX_RECORDS, max_bytes=BATCH_MAX_BYTES,
+                 max_age=BATCH_MAX_AGE, max_in_flight=MAX_IN_FLIGHT):
+        self.endpoint = endpoint
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.spool_path = os.path.join(SPOOL_DIR, re.sub(r"[^A-Za-z0-9]+", "_", endpoint).strip("_") + ".jsonl")
+        self.dead_letter_path = self.spool_path[:-len(".jsonl")] + ".dead.jsonl"
+
+        self._buffer = []        # JSON-encoded records
+        self._buffer_bytes = 0
+        self._timer = None
+        self._tasks = set()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._replay_lock = asyncio.Lock()
+
+    async def put(self, records):
+        """Queue records for delivery; returns immediately."""
+        for record in records:
+            encoded = json.dumps(record, default=str, separators=(",", ":")).encode()
+            self._buffer.append(encoded)
+            self._buffer_bytes += len(encoded) + 1
+            if len(self._buffer) >= self.max_records or self._buffer_bytes >= self.max_bytes:
+                self._dispatch()
+
+        if self._buffer and self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_age())
+
+    async def flush(self):
+        """Send everything buffered (plus any spooled backlog) and wait for it."""
+        await self._replay_spool()
+        self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _flush_after_age(self):
+        await asyncio.sleep(self.max_age)
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self):
+        if not self._buffer:
+            return
+        batch, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Backpressure: don't hold an unbounded backlog in memory while Blood is slow
+        if len(self._tasks) >= MAX_PENDING_BATCHES:
+            self._spill(batch)
+            return
+
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        body = b'{"data":[' + b",".join(batch) + b"]}"
+        headers = {"Content-Type": "application/json"}
+        if USE_GZIP:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+
+        async with self._in_flight:
+            try:
+                await retry_async(self._post, args=(body, headers), max_attempts=3,
+                                  base_delay=1, deadline=REQUEST_TIMEOUT * 3,
+                                  name=f"push_to_blood[{self.endpoint}]")
+            except Exception as e:
+                if get_status(e) is not None and not is_retryable(e):
+                    # Blood rejected the payload itself: re-sending it would fail forever
+                    print(f"[Blood] {self.endpoint} rejected {len(batch)} records ({e}); dead-lettering")
+                    self._spill(batch, self.dead_letter_path)
+                    return
+                print(f"[Blood] Delivery to {self.endpoint} failed ({e}); spooling {len(batch)} records")
+                self._spill(batch)
+
+    async def _post(self, body, headers):
+        response = await get_client().post(self.endpoint, content=body, headers=headers)
+        response.raise_for_status()
+        return response
+
+    # -------------------------
+    # Spill-to-disk buffer
+    # -------------------------
+    def _spill(self, batch, path=None):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        with open(path or self.spool_path, "ab") as f:
+            f.write(b"\n".join(batch) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _batches(self, lines):
+        batch, size = [], 0
+        for line in lines:
+            line = line.rstrip(b"\n")
+            if not line:
+                continue
+            batch.append(line)
+            size += len(line) + 1
+            if len(batch) >= self.max_records or size >= self.max_bytes:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
+
+    async def _replay_spool(self, max_batches=MAX_REPLAY_BATCHES):
+        """
+        Re-send spooled records. The spool is renamed to a .replay file first
+        (new failures keep spooling to a fresh file) and the .replay file is
+        removed only after every batch was delivered, dead-lettered or
+        re-spooled, so a crash mid-replay leaves it to be picked up next time.
+        Overlapping flushes wait for the running replay instead of sending
+        the same file twice; batches beyond max_batches are left in their
+        file for the next flush.
+        """
+        async with self._replay_lock:
+            if os.path.exists(self.spool_path):
+                os.replace(self.spool_path, f"{self.spool_path}.{time.time_ns()}.replay")
+
+            budget = max_batches
+            for replay_path in sorted(glob.glob(glob.escape(self.spool_path) + ".*.replay")):
+                if budget <= 0:
+                    break
+                with open(replay_path, "rb") as f:
+                    batches = list(self._batches(f))
+                sending, rest = batches[:budget], batches[budget:]
+                budget -= len(sending)
+                await asyncio.gather(*(self._send(batch) for batch in sending))
+                if rest:
+                    tmp = replay_path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(b"".join(line + b"\n" for batch in rest for line in batch))
+                    os.replace(tmp, replay_path)
+                else:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(replay_path)
+
+# -------------------------
+# Registry helpers
+# -------------------------
+def get_sink(endpoint):
+    if endpoint not in _sinks:
+        _sinks[endpoint] = BloodSink(endpoint)
+    return _sinks[endpoint]
+
+async def push_records(endpoint, records):
+    await get_sink(endpoint).put(records)
+
+async def flush_all():
+    await asyncio.gather(*(sink.flush() for sink in list(_sinks.values())))
+
+async def close_all():
+    global _client
+    await flush_all()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
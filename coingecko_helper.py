@@ -1,14 +1,26 @@
+import os
 from pycoingecko import CoinGeckoAPI
+from ttl_cache import TTLCache
 
 cg = CoinGeckoAPI()
 
+# Free tier rate-limits hard: at most one call per TTL across all processes
+TRENDING_TTL = int(os.getenv("COINGECKO_TRENDING_TTL", 600))  # seconds
+MARKETS_TTL = int(os.getenv("COINGECKO_MARKETS_TTL", 120))    # seconds
+
+cache = TTLCache("coingecko")
+
+def _fetch_trending_coins():
+    data = cg.search_trending()
+    return [item['item']['name'].lower() for item in data['coins']]
+
 def get_trending_coins():
     try:
-        data = cg.search_trending()
-        return [item['item']['name'].lower() for item in data['coins']]
+        return cache.get("trending", _fetch_trending_coins, ttl=TRENDING_TTL)
     except Exception as e:
+        # Only reached when nothing has ever been fetched successfully
         print(f"[Coingecko Error] {e}")
         return []
 
 def get_market_snapshot():
-    return cg.get_coins_markets(vs_currency='usd')
+    return cache.get("markets", lambda: cg.get_coins_markets(vs_currency='usd'), ttl=MARKETS_TTL)
@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime
+import os
+import re
+import json
+import base64
+from sqlalchemy import (create_engine, event, update, select, tuple_, Index, Column, String, Integer, Text,
+                        DateTime, LargeBinary, inspect, text)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
-from sentence_transformers import SentenceTransformer, util
+from datetime import datetime, timedelta
+from model_registry import get_model
+from vector_index import VectorIndex, dedup_within_batch, from_blobs, to_blob
 
 Base = declarative_base()
 
@@ -16,49 +23,331 @@ class Article(Base):
     keywords = Column(Text)  # comma-separated for now
     score = Column(Integer)
     clean_text = Column(Text)
+    embedding = Column(LargeBinary)  # normalized float32 title embedding
+
+    # Backs keyset pagination on (publish_date, id)
+    __table_args__ = (Index("ix_articles_publish_date_id", "publish_date", "id"),)
 
 engine = create_engine("sqlite:///rss_articles.db")
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets api.py readers run while ingestion writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")     # ~20 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")   # 256 MB
+    cursor.close()
+
 Base.metadata.create_all(engine)
 Session = sessionmaker(bind=engine)
 
-# Load semantic similarity model once
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Pooled connections for API readers; query_only guards against accidental writes
+read_engine = create_engine("sqlite:///rss_articles.db", pool_size=8, max_overflow=4)
+
+@event.listens_for(read_engine, "connect")
+def _set_read_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+# Databases created before the embedding column / pagination index existed
+if "embedding" not in {c["name"] for c in inspect(engine).get_columns("articles")}:
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE articles ADD COLUMN embedding BLOB"))
+for index in Article.__table__.indexes:
+    index.create(engine, checkfirst=True)
+
+# ------------------------------
+# Full-text search (FTS5, external content kept in sync by triggers)
+# ------------------------------
+# NOTE: articles has a string primary key, so FTS rows follow the implicit
+# rowid; run rebuild_fts_index() after a VACUUM.
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+        title, summary, clean_text, keywords,
+        content='articles', content_rowid='rowid', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_ai AFTER INSERT ON articles BEGIN
+        INSERT INTO articles_fts(rowid, title, summary, clean_text, keywords)
+        VALUES (new.rowid, new.title, new.summary, new.clean_text, new.keywords);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_ad AFTER DELETE ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, summary, clean_text, keywords)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.clean_text, old.keywords);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS articles_fts_au AFTER UPDATE OF title, summary, clean_text, keywords ON articles BEGIN
+        INSERT INTO articles_fts(articles_fts, rowid, title, summary, clean_text, keywords)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.clean_text, old.keywords);
+        INSERT INTO articles_fts(rowid, title, summary, clean_text, keywords)
+        VALUES (new.rowid, new.title, new.summary, new.clean_text, new.keywords);
+    END""",
+]
+
+# bm25 column weights: title, summary, clean_text, keywords
+FTS_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+SEARCH_MAX_LIMIT = 100
+
+def rebuild_fts_index():
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')"))
+
+def _init_fts():
+    with engine.begin() as conn:
+        created = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='articles_fts'"
+        )).first() is None
+        for statement in FTS_SCHEMA:
+            conn.execute(text(statement))
+        if created:
+            # Index articles stored before FTS existed
+            conn.execute(text("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')"))
+
+_init_fts()
+
+# ------------------------------
+# Cache generation (bumped whenever save_articles writes)
+# ------------------------------
+with engine.begin() as _conn:
+    _conn.execute(text("CREATE TABLE IF NOT EXISTS cache_generation (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"))
+    _conn.execute(text("INSERT OR IGNORE INTO cache_generation (name, value) VALUES ('articles', 0)"))
+
+def get_generation(conn=None):
+    """Current articles generation; API response caches key on it."""
+    query = text("SELECT value FROM cache_generation WHERE name = 'articles'")
+    if conn is not None:
+        return conn.execute(query).scalar() or 0
+    with read_engine.connect() as conn:
+        return conn.execute(query).scalar() or 0
+
+def bump_generation(session):
+    session.execute(text("UPDATE cache_generation SET value = value + 1 WHERE name = 'articles'"))
+
+def _fts_phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+def build_match_query(q, keywords=None):
+    """User text -> FTS5 MATCH expression: every word required, keywords matched on the keywords column."""
+    terms = [_fts_phrase(t) for t in re.findall(r"\w+", q or "")]
+    terms += [f"keywords : {_fts_phrase(kw.strip())}" for kw in (keywords or []) if kw.strip()]
+    return " AND ".join(terms)
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+class InvalidCursor(ValueError):
+    """A cursor query parameter that this module did not issue."""
+
+def decode_cursor(cursor, *types):
+    """Cursor -> values converted with types (one per value); raises InvalidCursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(f"expected {len(types)} values")
+        return [convert(value) for convert, value in zip(types, values)]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+
+def search_articles_fts(q, limit=20, cursor=None, source=None, since=None, until=None, keywords=None):
+    """
+    BM25-ranked search with snippets. Pages with an opaque keyset cursor on
+    (rank, rowid). Returns (results, next_cursor).
+    """
+    match = build_match_query(q, keywords)
+    if not match:
+        return [], None
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+
+    filters = []
+    params = {"match": match, "limit": limit + 1}
+    if source:
+        filters.append("a.source = :source")
+        params["source"] = source
+    # publish_date is stored as 'YYYY-MM-DD HH:MM:SS[.ffffff]'
+    if since:
+        filters.append("a.publish_date >= :since")
+        params["since"] = since.strftime("%Y-%m-%d %H:%M:%S")
+    if until:
+        filters.append("a.publish_date < :until")
+        params["until"] = until.strftime("%Y-%m-%d %H:%M:%S")
+    outer = ""
+    if cursor:
+        params["c_rank"], params["c_rowid"] = decode_cursor(cursor, float, int)
+        outer = "WHERE rank > :c_rank OR (rank = :c_rank AND rid > :c_rowid)"
+
+    sql = f"""
+        SELECT * FROM (
+            SELECT a.id, a.source, a.title, a.url, a.publish_date, a.keywords, a.score,
+                   snippet(articles_fts, 2, '<b>', '</b>', '…', 24) AS snippet,
+                   bm25(articles_fts, {", ".join(map(str, FTS_WEIGHTS))}) AS rank,
+                   articles_fts.rowid AS rid
+            FROM articles_fts JOIN articles a ON a.rowid = articles_fts.rowid
+            WHERE articles_fts MATCH :match {"".join(" AND " + f for f in filters)}
+        ) {outer}
+        ORDER BY rank, rid
+        LIMIT :limit
+    """
+    with read_engine.connect() as conn:
+        rows = [dict(r._mapping) for r in conn.execute(text(sql), params)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["rank"], rows[-1]["rid"])
+    for row in rows:
+        row.pop("rid")
+    return rows, next_cursor
+
+# Semantic similarity model is loaded on first use (api.py never needs it)
+def embedding_model():
+    return get_model("sentence_transformer")
+
+SIMILARITY_THRESHOLD = 0.85
+DEDUP_WINDOW = timedelta(hours=int(os.getenv("DEDUP_WINDOW_HOURS", 72)))
+DEDUP_MAX_ROWS = int(os.getenv("DEDUP_MAX_ROWS", 50000))
+SQLITE_MAX_PARAMS = 900  # stay under SQLite's bound-variable limit for IN (...)
 
 def is_semantically_similar(title1, title2, threshold=0.85):
     """Return True if titles are semantically similar beyond the threshold."""
-    embeddings = model.encode([title1, title2], convert_to_tensor=True)
+    from sentence_transformers import util
+    embeddings = embedding_model().encode([title1, title2], convert_to_tensor=True)
     similarity = util.cos_sim(embeddings[0], embeddings[1])
     return similarity.item() > threshold
 
+def encode_titles(titles):
+    """One batched forward pass; rows are L2-normalized float32."""
+    return embedding_model().encode(list(titles), convert_to_numpy=True, normalize_embeddings=True).astype("float32")
+
+def load_recent_index(session):
+    """
+    Vector index over titles published within DEDUP_WINDOW. Rows saved before
+    embeddings were stored are encoded once and backfilled.
+    """
+    cutoff = datetime.utcnow() - DEDUP_WINDOW
+    rows = (session.query(Article.id, Article.title, Article.embedding)
+            .filter(Article.publish_date >= cutoff)
+            .order_by(Article.publish_date.desc())
+            .limit(DEDUP_MAX_ROWS)
+            .all())
+
+    missing = [r for r in rows if r.embedding is None]
+    backfilled = {}
+    if missing:
+        vectors = encode_titles(r.title or "" for r in missing)
+        backfilled = {r.id: to_blob(vec) for r, vec in zip(missing, vectors)}
+        session.execute(update(Article), [{"id": id_, "embedding": blob} for id_, blob in backfilled.items()])
+
+    blobs = [r.embedding if r.embedding is not None else backfilled[r.id] for r in rows]
+    dim = embedding_model().get_sentence_embedding_dimension()
+    return VectorIndex(from_blobs(blobs, dim), dim)
+
+# ------------------------------
+# Paged reads (keyset on publish_date, id)
+# ------------------------------
+ARTICLE_VIEWS = {
+    "summary": [Article.id, Article.source, Article.title, Article.url, Article.summary,
+                Article.publish_date, Article.keywords, Article.score],
+}
+ARTICLE_VIEWS["full"] = ARTICLE_VIEWS["summary"] + [Article.clean_text]
+PAGE_MAX_LIMIT = 500
+
+def _article_row(row):
+    row = dict(row._mapping)
+    if row.get("publish_date") is not None:
+        row["publish_date"] = row["publish_date"].isoformat()
+    return row
+
+def fetch_articles_page(view="summary", limit=20, cursor=None, conn=None):
+    """
+    Newest-first page of articles projected to ARTICLE_VIEWS[view].
+    Returns (rows, next_cursor); pass next_cursor back to continue without
+    an OFFSET scan.
+    """
+    limit = max(1, min(int(limit), PAGE_MAX_LIMIT))
+    query = select(*ARTICLE_VIEWS[view]).order_by(Article.publish_date.desc(), Article.id.desc())
+    if cursor:
+        publish_date, article_id = decode_cursor(cursor, datetime.fromisoformat, str)
+        query = query.where(tuple_(Article.publish_date, Article.id) <
+                            tuple_(publish_date, article_id))
+    query = query.limit(limit + 1)
+
+    if conn is None:
+        with read_engine.connect() as conn:
+            rows = [_article_row(r) for r in conn.execute(query)]
+    else:
+        rows = [_article_row(r) for r in conn.execute(query)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["publish_date"], rows[-1]["id"])
+    return rows, next_cursor
+
+def iter_articles(view="summary", page_size=PAGE_MAX_LIMIT):
+    """Stream the whole archive page by page on one pooled read connection."""
+    with read_engine.connect() as conn:
+        cursor = None
+        while True:
+            rows, cursor = fetch_articles_page(view, page_size, cursor, conn)
+            yield from rows
+            if cursor is None:
+                return
+
+def existing_ids(session, ids):
+    """Ids already stored, checked with one IN query per SQLITE_MAX_PARAMS ids."""
+    ids = list(ids)
+    found = set()
+    for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+        chunk = ids[start:start + SQLITE_MAX_PARAMS]
+        found.update(row[0] for row in session.query(Article.id).filter(Article.id.in_(chunk)))
+    return found
+
 def save_articles(articles):
     session = Session()
 
-    # Fetch recent titles to compare for duplicates
-    recent = session.query(Article.title).order_by(Article.publish_date.desc()).limit(100).all()
-    recent_titles = [r[0] for r in recent]
-
+    # Skip articles whose id already exists (and repeats within the batch)
+    stored = existing_ids(session, {art['id'] for art in articles})
+    candidates = []
     for art in articles:
-        # Skip if exact article (by id) already exists
-        exists = session.query(Article).filter_by(id=art['id']).first()
-        if exists:
-            continue
-
-        # Skip if title is semantically similar to any recent title
-        is_duplicate = any(is_semantically_similar(art['title'], old_title) for old_title in recent_titles)
-        if is_duplicate:
-            print(f"Skipped duplicate title: {art['title']}")
-            continue
-
-        session.add(Article(
-            id=art['id'],
-            source=art['source'],
-            title=art['title'],
-            url=art['url'],
-            summary=art['summary'],
-            publish_date=datetime.fromisoformat(art['publish_date']),
-            keywords=",".join(art['keywords']),
-            score=art['score'],
-            clean_text=art['clean_text']
-        ))
+        if art['id'] not in stored:
+            stored.add(art['id'])
+            candidates.append(art)
+
+    if candidates:
+        # Encode each new title once and compare against the recent window in one matrix product
+        vectors = encode_titles(art['title'] for art in candidates)
+        index = load_recent_index(session)
+        similar_to_recent = index.max_similarity(vectors) > SIMILARITY_THRESHOLD
+        keep = dedup_within_batch(vectors, SIMILARITY_THRESHOLD) & ~similar_to_recent
+
+        rows = []
+        for art, vec, is_new in zip(candidates, vectors, keep):
+            if not is_new:
+                print(f"Skipped duplicate title: {art['title']}")
+                continue
+
+            rows.append(dict(
+                id=art['id'],
+                source=art['source'],
+                title=art['title'],
+                url=art['url'],
+                summary=art['summary'],
+                publish_date=datetime.fromisoformat(art['publish_date']),
+                keywords=",".join(art['keywords']),
+                score=art['score'],
+                clean_text=art['clean_text'],
+                embedding=to_blob(vec)
+            ))
+
+        # One executemany; ON CONFLICT covers a concurrent writer inserting the same id
+        if rows:
+            session.execute(sqlite_insert(Article).on_conflict_do_nothing(index_elements=["id"]), rows)
+            bump_generation(session)  # invalidates cached API responses
     session.commit()
     session.close()
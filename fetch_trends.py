@@ -4,6 +4,8 @@ from pytrends.request import TrendReq
 import requests
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+from retry_helper import retryable, log_retry
+from supabase_bulk import bulk_upsert
 
 # ------------------------------
 # LOAD ENVIRONMENT VARIABLES
@@ -14,6 +16,7 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 OLLAMA_API_KEY = os.getenv("OLLAMA_API_KEY")
 TREND_KEYWORDS = os.getenv("TREND_KEYWORDS", "python,ai").split(",")
+REQUEST_TIMEOUT = 30  # seconds
 
 # Validate Supabase credentials
 if not SUPABASE_URL or not SUPABASE_KEY:
@@ -27,34 +30,83 @@ pd.set_option('future.no_silent_downcasting', True)  # suppress pandas warnings
 # ------------------------------
 # FUNCTIONS
 # ------------------------------
-def fetch_google_trends(keywords):
+PYTRENDS_MAX_KEYWORDS = 5  # pytrends/Google Trends limit per payload
+
+@retryable(max_attempts=3, base_delay=5, deadline=120, on_retry=log_retry)
+def _interest_over_time(pytrends, batch, timeframe):
+    pytrends.build_payload(batch, timeframe=timeframe, geo='')
+    return pytrends.interest_over_time()
+
+def _keyword_batches(keywords, anchor):
+    """Split keywords into pytrends-sized batches that all include the anchor keyword."""
+    others = [kw for kw in keywords if kw != anchor]
+    size = PYTRENDS_MAX_KEYWORDS - 1
+    return [[anchor] + others[i:i + size] for i in range(0, len(others), size)] or [[anchor]]
+
+def _to_long(wide, batch):
+    """Wide interest_over_time frame -> typed long format (no row iteration)."""
+    wide = wide.reset_index()
+    if "isPartial" not in wide.columns:
+        wide["isPartial"] = False
+    long = wide.melt(id_vars=["date", "isPartial"], value_vars=batch, var_name="keyword", value_name="value")
+    return pd.DataFrame({
+        "keyword": long["keyword"].astype(str),
+        "value": long["value"].round().astype("int32"),
+        "is_partial": long["isPartial"].astype(bool),
+        "timestamp": pd.to_datetime(long["date"], utc=True),
+    })
+
+def fetch_google_trends(keywords, anchor=None, timeframe='now 1-d'):
+    """
+    Interest over time for any number of keywords, in long format
+    (keyword, value:int32, is_partial:bool, timestamp:datetime64[UTC]).
+
+    Keywords beyond pytrends' 5-per-request limit are fetched in batches that
+    all include `anchor` (default: first keyword); each batch is rescaled so
+    its anchor series matches the first batch, making values comparable.
+    """
+    keywords = list(dict.fromkeys(keywords))
+    if not keywords:
+        return pd.DataFrame()
+    anchor = anchor or keywords[0]
+    if anchor not in keywords:
+        keywords.insert(0, anchor)
+
     pytrends = TrendReq(hl='en-US', tz=360)
-    pytrends.build_payload(keywords, timeframe='now 1-d', geo='')
-    df = pytrends.interest_over_time()
-    if df.empty:
+    frames = []
+    reference = None
+    for batch in _keyword_batches(keywords, anchor):
+        wide = _interest_over_time(pytrends, batch, timeframe)
+        if wide.empty:
+            continue
+        if reference is None:
+            reference = wide[anchor].astype(float)
+        elif len(batch) > 1:
+            anchor_sum = wide[anchor].astype(float).reindex(reference.index).sum()
+            scale = reference.sum() / anchor_sum if anchor_sum > 0 else 1.0
+            wide = wide.copy()
+            wide[batch[1:]] = wide[batch[1:]].astype(float) * scale
+            batch = batch[1:]  # anchor rows already come from the first batch
+        frames.append(_to_long(wide, batch))
+
+    if not frames:
         return pd.DataFrame()
-    df.reset_index(inplace=True)
-    df['timestamp'] = df['date'].apply(lambda x: x.isoformat())
-    records = []
-    for _, row in df.iterrows():
-        for kw in keywords:
-            records.append({
-                "keyword": kw,
-                "value": int(row[kw]),
-                "is_partial": bool(row["isPartial"]),
-                "timestamp": row["timestamp"]
-            })
-    return pd.DataFrame(records)
+    long = pd.concat(frames, ignore_index=True)
+    return long.sort_values(["timestamp"], kind="stable").reset_index(drop=True)
+
+@retryable(max_attempts=3, base_delay=2, deadline=60, on_retry=log_retry)
+def _get_ollama_trends():
+    headers = {"Authorization": f"Bearer {OLLAMA_API_KEY}"}
+    resp = requests.get("https://api.ollama.com/v1/trends", headers=headers, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
 
 def fetch_ollama_trends():
     if not OLLAMA_API_KEY:
         print("⚠️ OLLAMA_API_KEY not set. Skipping Ollama trends.")
         return pd.DataFrame()
-    headers = {"Authorization": f"Bearer {OLLAMA_API_KEY}"}
     try:
-        resp = requests.get("https://api.ollama.com/v1/trends", headers=headers)
-        resp.raise_for_status()
-        data = resp.json()
+        data = _get_ollama_trends()
         df = pd.DataFrame(data.get('trends', []))
         if not df.empty:
             df['timestamp'] = datetime.now(timezone.utc).isoformat()
@@ -63,26 +115,19 @@ def fetch_ollama_trends():
         print(f"⚠️ Failed to fetch Ollama trends: {e}")
         return pd.DataFrame()
 
-def save_to_supabase(df, table_name="trends"):
+def save_to_supabase(df, table_name="trends", on_conflict=None):
+    """
+    Bulk upsert a frame with native types (chunked, parallel, gzip).
+    on_conflict: comma-separated conflict key; default merges on the primary key.
+    """
     if df.empty:
         print("⚠️ No data to save")
         return
-    url = f"{SUPABASE_URL}/rest/v1/{table_name}"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates"
-    }
-    records = df.astype(str).to_dict(orient="records")
-    try:
-        response = requests.post(url, headers=headers, json=records)
-        if response.status_code not in [200, 201]:
-            print("❌ Error saving records:", response.text)
-        else:
-            print(f"✅ Saved {len(records)} records to {table_name}")
-    except requests.RequestException as e:
-        print(f"❌ Failed to save to Supabase: {e}")
+    result = bulk_upsert(table_name, df, on_conflict=on_conflict)
+    if result["failed"]:
+        print(f"❌ Error saving {len(result['failed'])} records to {table_name}:", result["errors"][0])
+    print(f"✅ Saved {result['written']} records to {table_name}")
+    return result
 
 # ------------------------------
 # MAIN
@@ -1,6 +1,10 @@
 # heartbeat_logger.py
 
 import os
+import atexit
+import random
+import threading
+from collections import deque
 from datetime import datetime, timezone
 from supabase import create_client
 import requests
@@ -12,15 +16,82 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Initialize Supabase client if credentials are available
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
 
+# Background sink tuning
+BUFFER_SIZE = int(os.getenv("HEARTBEAT_BUFFER_SIZE", 2000))        # ring buffer capacity
+FLUSH_BATCH_SIZE = int(os.getenv("HEARTBEAT_FLUSH_BATCH", 100))     # rows per bulk insert
+FLUSH_INTERVAL = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL", 5))    # seconds
+HIGH_WATERMARK = 0.75                                               # buffer fill ratio that counts as backpressure
+INFO_SAMPLE_RATE = float(os.getenv("HEARTBEAT_INFO_SAMPLE_RATE", 0.1))  # share of info rows kept under backpressure
+LOW_VALUE_STATUSES = {"info"}
+
+_buffer = deque(maxlen=BUFFER_SIZE)
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_stopping = threading.Event()
+_worker = None
+dropped_count = 0
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run_worker, name="heartbeat-sink", daemon=True)
+        _worker.start()
+
+
+def _run_worker():
+    while not _stopping.is_set():
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        flush_heartbeats()
+
+
+def flush_heartbeats():
+    """Write every buffered heartbeat to Supabase in bulk inserts."""
+    while True:
+        with _lock:
+            batch = [_buffer.popleft() for _ in range(min(FLUSH_BATCH_SIZE, len(_buffer)))]
+        if not batch:
+            return
+        try:
+            supabase.table("heartbeat_logs").insert(batch).execute()
+        except Exception as e:
+            print(f"❌ Exception saving {len(batch)} heartbeats: {e}")
+            # Keep the important rows for the next flush if there is room
+            with _lock:
+                for row in reversed(batch):
+                    if row["status"] not in LOW_VALUE_STATUSES and len(_buffer) < BUFFER_SIZE:
+                        _buffer.appendleft(row)
+            return
+
+
+def shutdown_heartbeats():
+    """Stop the background sink and flush whatever is still buffered."""
+    _stopping.set()
+    _wakeup.set()
+    if _worker is not None and _worker.is_alive():
+        _worker.join(timeout=FLUSH_INTERVAL + 5)
+    if supabase:
+        flush_heartbeats()
+
+
+atexit.register(shutdown_heartbeats)
+
+
 def log_heartbeat(status, details, retries=0):
     """
     Logs a heartbeat to Supabase (if configured) and prints to console.
-    
+
+    Rows are buffered in memory and written by a background thread in bulk
+    inserts every FLUSH_BATCH_SIZE rows or FLUSH_INTERVAL seconds. When the
+    buffer is under backpressure, low-value 'info' rows are sampled.
+
     Args:
         status (str): Status of the heartbeat (e.g., 'ok', 'error').
         details (str): Any additional information about the heartbeat.
         retries (int): Number of retry attempts (default 0).
     """
+    global dropped_count
     timestamp = datetime.now(timezone.utc).isoformat()
     print(f"[{timestamp}] {status.upper()}: {details} (retries: {retries})")
 
@@ -28,13 +99,20 @@ def log_heartbeat(status, details, retries=0):
         print("⚠️ Supabase not configured. Skipping persistent heartbeat.")
         return
 
-    try:
-        # Save heartbeat to Supabase table 'heartbeat_logs'
-        supabase.table("heartbeat_logs").insert({
-            "timestamp": timestamp,
-            "status": status,
-            "details": details,
-            "retries": retries
-        }).execute()
-    except Exception as e:
-        print(f"❌ Exception saving heartbeat: {e}")
+    row = {
+        "timestamp": timestamp,
+        "status": status,
+        "details": details,
+        "retries": retries
+    }
+    with _lock:
+        backpressure = len(_buffer) >= BUFFER_SIZE * HIGH_WATERMARK
+        if backpressure and status in LOW_VALUE_STATUSES and random.random() >= INFO_SAMPLE_RATE:
+            dropped_count += 1
+            return
+        _buffer.append(row)
+        pending = len(_buffer)
+
+    _ensure_worker()
+    if pending >= FLUSH_BATCH_SIZE:
+        _wakeup.set()
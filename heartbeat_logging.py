@@ -1,9 +1,105 @@
 import os
-from datetime import datetime
+import glob
+import gzip
 import json
+import shutil
+from datetime import datetime, timedelta
+
+# Path for heartbeat log (one JSON object per line, append-only)
+LOG_FILE = "heartbeat_log.jsonl"
+LEGACY_LOG_FILE = "heartbeat_log.json"  # old JSON-array format, migrated once
+MIGRATED_MARKER = LEGACY_LOG_FILE + ".migrated"  # legacy file stays in place (it is tracked)
+
+# Rotation
+MAX_LOG_BYTES = int(os.getenv("HEARTBEAT_LOG_MAX_BYTES", 5 * 1024 * 1024))
+MAX_LOG_AGE = timedelta(days=int(os.getenv("HEARTBEAT_LOG_MAX_DAYS", 7)))
+COMPRESS_ROTATED = os.getenv("HEARTBEAT_LOG_COMPRESS", "1") == "1"
+KEEP_ROTATED = int(os.getenv("HEARTBEAT_LOG_KEEP", 10))
+
+_migrated = False
+
+
+def migrate_legacy_log():
+    """
+    One-shot conversion of the old JSON-array heartbeat_log.json into the
+    JSONL log. A *.migrated marker records that it was done.
+    """
+    global _migrated
+    _migrated = True
+    if not os.path.exists(LEGACY_LOG_FILE) or os.path.exists(MIGRATED_MARKER):
+        return 0
+
+    with open(LEGACY_LOG_FILE, "r") as f:
+        try:
+            entries = json.load(f)
+        except json.JSONDecodeError:
+            entries = []
+
+    # Legacy entries are older than anything already in the JSONL log
+    existing = LOG_FILE + ".tmp"
+    with open(existing, "w") as out:
+        for entry in entries:
+            out.write(json.dumps(entry) + "\n")
+        if os.path.exists(LOG_FILE):
+            with open(LOG_FILE, "r") as current:
+                shutil.copyfileobj(current, out)
+    os.replace(existing, LOG_FILE)
+    open(MIGRATED_MARKER, "w").close()
+    print(f"Migrated {len(entries)} heartbeat entries to {LOG_FILE}")
+    return len(entries)
+
+
+def _first_timestamp(path):
+    with open(path, "r") as f:
+        line = f.readline()
+    try:
+        return datetime.fromisoformat(json.loads(line)["timestamp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _should_rotate(now):
+    if not os.path.exists(LOG_FILE):
+        return False
+    if os.path.getsize(LOG_FILE) >= MAX_LOG_BYTES:
+        return True
+    started = _first_timestamp(LOG_FILE)
+    return started is not None and now - started >= MAX_LOG_AGE
+
+
+def _rotated_files():
+    """Rotated segments, oldest first (names sort by rotation time)."""
+    return sorted(glob.glob(f"{LOG_FILE[:-len('.jsonl')]}.*.jsonl*"))
+
+
+def rotate_log(now=None):
+    """Close the current segment, optionally gzip it and prune old segments."""
+    now = now or datetime.utcnow()
+    base = LOG_FILE[:-len(".jsonl")]
+    rotated = f"{base}.{now.strftime('%Y%m%dT%H%M%S%f')}.jsonl"
+    os.replace(LOG_FILE, rotated)
+
+    if COMPRESS_ROTATED:
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+    for old in _rotated_files()[:-KEEP_ROTATED or None]:
+        os.remove(old)
+
+
+def iter_heartbeats(include_rotated=True):
+    """Lazily yield heartbeat entries, oldest first."""
+    paths = _rotated_files() if include_rotated else []
+    if os.path.exists(LOG_FILE):
+        paths.append(LOG_FILE)
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
 
-# Path for heartbeat log
-LOG_FILE = "heartbeat_log.json"
 
 def log_heartbeat(status="success", message=""):
     """
@@ -11,29 +107,23 @@ def log_heartbeat(status="success", message=""):
     status: "success" or "failure"
     message: optional descriptive text
     """
-    timestamp = datetime.utcnow().isoformat()
+    if not _migrated:
+        migrate_legacy_log()
+
+    now = datetime.utcnow()
+    timestamp = now.isoformat()
     entry = {
         "timestamp": timestamp,
         "status": status,
         "message": message
     }
 
-    # Read existing log
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r") as f:
-            try:
-                log_data = json.load(f)
-            except json.JSONDecodeError:
-                log_data = []
-    else:
-        log_data = []
-
-    # Append new entry
-    log_data.append(entry)
-
-    # Save back to file
-    with open(LOG_FILE, "w") as f:
-        json.dump(log_data, f, indent=2)
+    if _should_rotate(now):
+        rotate_log(now)
+
+    # Append one line; cost does not depend on log size
+    with open(LOG_FILE, "a") as f:
+        f.write(json.dumps(entry) + "\n")
 
     print(f"[{timestamp}] Heartbeat logged: {status} - {message}")
 
@@ -0,0 +1,276 @@
+# key_pool.py
+"""
+Quota-aware API key pool.
+
+Tracks per-key daily usage (in Redis when UPSTASH_URL is set, otherwise a
+local JSON file shared by runs on this machine), paces each key with its
+own token bucket kept in the same store and routes every request to the usable key that is ready
+soonest and has the most quota left. Keys that hit rateLimitExceeded are
+cooled down; keys that exhaust their daily quota rest until the quota
+resets, and invalid keys are set aside for a day. Throughput grows with
+the number of keys configured.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from redis_manager import sync_client
+
+try:
+    import fcntl  # POSIX: serializes LocalKeyStore updates across processes
+except ImportError:
+    fcntl = None
+
+CONFIG_PATH = "config/api_keys.json"
+STATE_PATH = os.getenv("KEY_POOL_STATE", "key_pool_state.json")
+
+DEFAULT_DAILY_QUOTA = int(os.getenv("GOOGLE_CSE_DAILY_QUOTA", 100))  # Custom Search free tier
+DEFAULT_QPS = float(os.getenv("GOOGLE_CSE_QPS", 1.0))               # per key
+RATE_LIMIT_COOLDOWN = 60 * 10       # seconds after rateLimitExceeded / 429
+INVALID_KEY_COOLDOWN = 60 * 60 * 24  # seconds after keyInvalid
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")  # Google daily quotas reset at midnight Pacific
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+DAILY_LIMIT_REASONS = {"dailyLimitExceeded", "quotaExceeded"}
+INVALID_KEY_REASONS = {"keyInvalid", "keyExpired", "API_KEY_INVALID"}
+
+
+class KeyPoolExhausted(RuntimeError):
+    """No key has quota left (or all are cooling down)."""
+
+
+def key_id(key):
+    """Stable short id so raw keys are never written to state storage."""
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+def quota_day(now=None):
+    return (now or datetime.now(QUOTA_TIMEZONE)).astimezone(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+def next_quota_reset():
+    now = datetime.now(QUOTA_TIMEZONE)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+def error_reasons(response):
+    """
+    Every Google API error reason in a response ('API_KEY_INVALID',
+    'rateLimitExceeded', ...), details[] first: for a bad key errors[] only
+    says 'badRequest'.
+    """
+    try:
+        error = response.json().get("error", {})
+    except (ValueError, AttributeError):
+        return []
+    reasons = [d.get("reason") for d in error.get("details", []) + error.get("errors", [])]
+    reasons.append(error.get("status"))
+    return [r for r in reasons if r]
+
+def rotates_key(reasons):
+    """True when the error is about the key (throttled, exhausted, invalid), so another key may work."""
+    return bool(set(reasons) & (RATE_LIMIT_REASONS | DAILY_LIMIT_REASONS | INVALID_KEY_REASONS))
+
+
+# ------------------------------
+# Usage stores
+# ------------------------------
+# Each store also holds every key's token bucket (burst of 1): the time its
+# next request may start, so QPS is shared by every user of the store.
+class LocalKeyStore:
+    """
+    Usage, cool-downs and rate slots in a local JSON file. Every update
+    re-reads the file under an exclusive lock (fcntl, where available), so
+    processes on this machine share quota and slots.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+
+    @contextmanager
+    def _update(self):
+        """Fresh state from disk, written back on exit; one writer at a time."""
+        with self._lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._state = self._read()
+                yield self._state
+                self._save()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entry(self, kid):
+        entry = self._state.setdefault(kid, {"day": None, "used": 0, "cooldown_until": 0})
+        entry.setdefault("next_slot", 0)
+        return entry
+
+    def _current(self, kid):
+        with self._lock:
+            self._state = self._read()
+            return self._entry(kid)
+
+    def used(self, kid, day):
+        entry = self._current(kid)
+        return entry["used"] if entry["day"] == day else 0
+
+    def incr(self, kid, day):
+        with self._update():
+            entry = self._entry(kid)
+            if entry["day"] != day:
+                entry["day"], entry["used"] = day, 0
+            entry["used"] += 1
+
+    def cooldown_until(self, kid):
+        return self._current(kid)["cooldown_until"]
+
+    def set_cooldown(self, kid, until):
+        with self._update():
+            self._entry(kid)["cooldown_until"] = until
+
+    def next_slot(self, kid):
+        return self._current(kid)["next_slot"]
+
+    def reserve_slot(self, kid, now, interval):
+        """Take the key's next slot; returns when the request may start."""
+        with self._update():
+            entry = self._entry(kid)
+            start = max(now, entry["next_slot"])
+            entry["next_slot"] = start + interval
+            return start
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.path)
+
+
+# Atomic slot reservation. KEYS[1]=slot key  ARGV[1]=now  ARGV[2]=interval
+RESERVE_SLOT_LUA = """
+local start = math.max(tonumber(ARGV[1]), tonumber(redis.call('GET', KEYS[1]) or '0'))
+redis.call('SET', KEYS[1], tostring(start + tonumber(ARGV[2])), 'EX', 3600)
+return tostring(start)
+"""
+
+class RedisKeyStore:
+    """Usage, cool-downs and rate slots in Redis, shared by every process."""
+
+    def __init__(self, client, prefix="keypool"):
+        self.r = client
+        self.prefix = prefix
+        self._reserve_slot = client.register_script(RESERVE_SLOT_LUA)
+
+    def used(self, kid, day):
+        return int(self.r.get(f"{self.prefix}:{kid}:{day}") or 0)
+
+    def incr(self, kid, day):
+        with self.r.pipeline(transaction=False) as pipe:
+            pipe.incr(f"{self.prefix}:{kid}:{day}")
+            pipe.expire(f"{self.prefix}:{kid}:{day}", 60 * 60 * 48)
+            pipe.execute()
+
+    def cooldown_until(self, kid):
+        return float(self.r.get(f"{self.prefix}:{kid}:cooldown") or 0)
+
+    def set_cooldown(self, kid, until):
+        ttl = max(1, int(until - time.time()))
+        self.r.set(f"{self.prefix}:{kid}:cooldown", until, ex=ttl)
+
+    def next_slot(self, kid):
+        return float(self.r.get(f"{self.prefix}:{kid}:slot") or 0)
+
+    def reserve_slot(self, kid, now, interval):
+        return float(self._reserve_slot(keys=[f"{self.prefix}:{kid}:slot"], args=[now, interval]))
+
+
+def default_store():
+    try:
+        client = sync_client()
+        if client is not None:
+            return RedisKeyStore(client)
+    except Exception as e:
+        print(f"[KeyPool] Redis unavailable ({e}); using local state")
+    return LocalKeyStore()
+
+
+# ------------------------------
+# Pool
+# ------------------------------
+class KeyPool:
+    def __init__(self, keys, daily_quota=DEFAULT_DAILY_QUOTA, qps=DEFAULT_QPS, store=None):
+        self.keys = list(dict.fromkeys(k for k in keys if k))
+        if not self.keys:
+            raise ValueError("[❌] No API keys configured!")
+        self.daily_quota = daily_quota
+        self.qps = qps
+        self.store = store or default_store()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, service="google_search", path=CONFIG_PATH, fallback=(), **kwargs):
+        keys = []
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                keys = json.load(f).get(service, [])
+        return cls(list(keys) + list(fallback), **kwargs)
+
+    def remaining(self, key, day=None):
+        return self.daily_quota - self.store.used(key_id(key), day or quota_day())
+
+    def acquire(self, max_wait=30.0):
+        """
+        Pick the key that can send soonest (most remaining quota on ties),
+        wait for its token and count the request. Raises KeyPoolExhausted.
+        """
+        day = quota_day()
+        with self._lock:
+            now = time.time()
+            candidates = []
+            for key in self.keys:
+                kid = key_id(key)
+                if self.store.cooldown_until(kid) > now:
+                    continue
+                left = self.daily_quota - self.store.used(kid, day)
+                if left <= 0:
+                    continue
+                candidates.append((max(0.0, self.store.next_slot(kid) - now), -left, key))
+            if not candidates:
+                raise KeyPoolExhausted("All API keys are exhausted or cooling down")
+            wait, _, key = min(candidates)
+            if wait > max_wait:
+                raise KeyPoolExhausted(f"Next API key slot is {wait:.1f}s away")
+            # Another process may have taken the slot meanwhile: the store decides
+            wait = max(0.0, self.store.reserve_slot(key_id(key), now, 1.0 / self.qps) - now)
+            self.store.incr(key_id(key), day)
+
+        if wait:
+            time.sleep(wait)
+        return key
+
+    def report(self, key, status_code, reasons=()):
+        """Feed back a response status and error reasons so throttled, exhausted or invalid keys are rested."""
+        kid = key_id(key)
+        reasons = {reasons} if isinstance(reasons, str) else set(reasons or ())
+        if reasons & DAILY_LIMIT_REASONS:
+            self.store.set_cooldown(kid, next_quota_reset())
+        elif status_code == 429 or reasons & RATE_LIMIT_REASONS:
+            self.store.set_cooldown(kid, time.time() + RATE_LIMIT_COOLDOWN)
+        elif reasons & INVALID_KEY_REASONS:
+            self.store.set_cooldown(kid, time.time() + INVALID_KEY_COOLDOWN)
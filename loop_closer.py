@@ -1,10 +1,13 @@
+import os
 import random
 import time
 import datetime
 import numpy as np
+import pandas as pd
 from datetime import timedelta
 from supabase import create_client
 from heartbeat_logging import log_heartbeat
+from performance_rpc import rpc_source_performance
 
 # --- CONFIG ---
 SUPABASE_URL = "https://ajkemrtlmbuvyjkrioze.supabase.co"
@@ -16,6 +19,20 @@ VALID_SOURCES = ["Twitter", "Google", "Reddit", "Medium", "LinkedIn"]
 MAX_RETRIES = 3
 RETRY_DELAY = 30  # seconds
 
+# "local" pulls new rows and aggregates them here; "rpc" lets Postgres aggregate
+# them (sql/004_performance_id_watermark.sql) and only receives one row per source
+MODE = os.getenv("LOOP_CLOSER_MODE", "local")
+
+# Incremental analytics: only rows inserted after the stored watermark are pulled.
+# The watermark is content_performance.id (assigned at insert), not recorded_at,
+# so rows that arrive late with an older timestamp are still counted.
+EWMA_ALPHA = 0.1   # weight of each new row in the decayed CTR
+PAGE_SIZE = 1000   # PostgREST max rows per request
+PERFORMANCE_COLUMNS = "id,asin,source,clicks,conversions,revenue,recorded_at"
+# Running per-source aggregates kept on prompt_weights (see sql/001 and sql/004)
+AGGREGATE_COLUMNS = ["sample_count", "clicks_sum", "conversions_sum", "revenue_sum",
+                     "ctr_sum", "ctr_ewma", "last_recorded_at", "last_performance_id"]
+
 # ------------------------------
 # FUNCTIONS
 # ------------------------------
@@ -42,55 +59,162 @@ def seed_fake_performance():
     print("✅ Fake data seeded.")
 
 def fix_missing_sources(performance):
-    for row in performance:
-        if not row.get("source"):
-            new_source = random.choice(VALID_SOURCES)
-            row["source"] = new_source
-            supabase.table("content_performance").update({"source": new_source}).eq("asin", row["asin"]).execute()
+    """Assign a random source to rows without one: one update per source, not per row."""
+    missing = performance["source"].isna() | (performance["source"] == "")
+    if not missing.any():
+        return performance
+    performance.loc[missing, "source"] = np.random.choice(VALID_SOURCES, size=int(missing.sum()))
+    for src, asins in performance[missing].groupby("source")["asin"]:
+        supabase.table("content_performance").update({"source": src}).in_("asin", asins.unique().tolist()).execute()
     return performance
 
-def analyze_performance():
-    trends = supabase.table("trends").select("*").execute().data
-    performance = supabase.table("content_performance").select("*").execute().data
+def load_aggregates():
+    """Running per-source aggregates stored on prompt_weights, indexed by source."""
+    rows = supabase.table("prompt_weights").select(",".join(["source"] + AGGREGATE_COLUMNS)).execute().data
+    aggregates = pd.DataFrame(rows, columns=["source"] + AGGREGATE_COLUMNS).set_index("source")
+    for col in ("sample_count", "clicks_sum", "conversions_sum", "revenue_sum", "ctr_sum"):
+        aggregates[col] = pd.to_numeric(aggregates[col]).fillna(0)
+    aggregates["ctr_ewma"] = pd.to_numeric(aggregates["ctr_ewma"])
+    aggregates["last_performance_id"] = pd.to_numeric(aggregates["last_performance_id"])
+    return aggregates
+
+def fetch_new_performance(watermark):
+    """
+    content_performance rows with id above watermark (all rows when None),
+    in id order. Ids are taken at insert but become visible at commit, so a
+    row whose transaction commits after a higher id was read is skipped;
+    writers here insert in single short statements, which keeps that window
+    to concurrent inserts within one run.
+    """
+    rows, start = [], 0
+    while True:
+        query = supabase.table("content_performance").select(PERFORMANCE_COLUMNS)
+        if watermark is not None:
+            query = query.gt("id", watermark)
+        page = query.order("id").range(start, start + PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+    performance = pd.DataFrame(rows, columns=PERFORMANCE_COLUMNS.split(","))
+    for col in ("clicks", "conversions", "revenue"):
+        performance[col] = pd.to_numeric(performance[col]).fillna(0)
+    return performance
 
-    if not performance:
-        seed_fake_performance()
-        performance = supabase.table("content_performance").select("*").execute().data
+def batch_aggregates(performance, alpha=EWMA_ALPHA):
+    """
+    Per-source aggregates of new rows, in the shape source_performance_v2
+    returns (see performance_rpc.BATCH_COLUMNS).
+    """
+    performance = performance.sort_values("id", kind="stable")
+    clicks = performance["clicks"].to_numpy(dtype=float)
+    performance["ctr"] = np.divide(performance["conversions"].to_numpy(dtype=float), clicks,
+                                   out=np.zeros_like(clicks), where=clicks > 0)
+
+    grouped = performance.groupby("source")
+    batch = grouped.agg(
+        sample_count=("ctr", "size"),
+        clicks_sum=("clicks", "sum"),
+        conversions_sum=("conversions", "sum"),
+        revenue_sum=("revenue", "sum"),
+        ctr_sum=("ctr", "sum"),
+        first_ctr=("ctr", "first"),
+        last_recorded_at=("recorded_at", "max"),
+        last_performance_id=("id", "max"),
+    )
+
+    # EWMA over each source's new rows: sum(alpha * (1-alpha)^age * ctr), age 0 = newest
+    age = grouped.cumcount(ascending=False)
+    batch["ctr_contrib"] = (alpha * (1 - alpha) ** age * performance["ctr"]).groupby(performance["source"]).sum()
+    batch["decay"] = (1 - alpha) ** batch["sample_count"]
+    return batch
+
+def merge_aggregates(aggregates, batch):
+    """
+    Fold a batch into the running aggregates: counts and sums add up, and
+    the CTR EWMA decays the stored value by (1 - alpha) per new row.
+    """
+    merged = aggregates.reindex(aggregates.index.union(batch.index))
+    merged.index.name = "source"
+    for col in ("sample_count", "clicks_sum", "conversions_sum", "revenue_sum", "ctr_sum"):
+        merged[col] = merged[col].fillna(0).add(batch[col], fill_value=0)
+
+    # Sources seen for the first time start their EWMA at their first CTR
+    previous = merged.loc[batch.index, "ctr_ewma"].fillna(batch["first_ctr"])
+    merged.loc[batch.index, "ctr_ewma"] = batch["decay"] * previous + batch["ctr_contrib"]
+    # Late rows can carry an older recorded_at; keep the newest seen
+    stored = merged.loc[batch.index, "last_recorded_at"]
+    merged.loc[batch.index, "last_recorded_at"] = stored.combine(
+        batch["last_recorded_at"], lambda old, new: new if pd.isna(old) else max(old, new))
+    merged.loc[batch.index, "last_performance_id"] = batch["last_performance_id"]
+    return merged
+
+def fetch_unsourced_performance(watermark):
+    """New rows without a source (normally none), so they can be fixed before aggregating."""
+    query = supabase.table("content_performance").select(PERFORMANCE_COLUMNS).or_("source.is.null,source.eq.")
+    if watermark is not None:
+        query = query.gt("id", watermark)
+    return pd.DataFrame(query.execute().data, columns=PERFORMANCE_COLUMNS.split(","))
+
+def compute_batch(watermark):
+    """Per-source aggregates of rows inserted after watermark, locally or in Postgres."""
+    if MODE == "rpc":
+        unsourced = fetch_unsourced_performance(watermark)
+        if not unsourced.empty:
+            fix_missing_sources(unsourced)
+        return rpc_source_performance(supabase, watermark, EWMA_ALPHA)
+
+    performance = fetch_new_performance(watermark)
+    if performance.empty:
+        return batch_aggregates(performance)
+    return batch_aggregates(fix_missing_sources(performance))
+
+def weight_records(aggregates, batch):
+    """
+    prompt_weights rows for the sources in batch, weighted by their decayed
+    CTR relative to the best source. Sources without new rows are left as
+    they are. Returns (records, {source: weight}).
+    """
+    scores = aggregates["ctr_ewma"].fillna(0)
+    max_score = scores.max() or 1
+    weights = (scores / max_score + 0.5).round(2)
+
+    now = datetime.datetime.utcnow().isoformat()
+    rows = aggregates.assign(weight=weights, performance_score=scores.round(4), last_analyzed=now).loc[batch.index]
+    rows = rows.reset_index().astype({"sample_count": "int64", "last_performance_id": "Int64"})
+    rows = rows[["source", "weight", "performance_score", "last_analyzed"] + AGGREGATE_COLUMNS]
+    records = [{k: (None if pd.isna(v) else v.item() if hasattr(v, "item") else v) for k, v in row.items()}
+               for row in rows.to_dict(orient="records")]
+    return records, weights.loc[batch.index].to_dict()
 
-    if not trends:
+def analyze_performance():
+    if not supabase.table("trends").select("keyword").limit(1).execute().data:
         print("⚠️ trends table is empty. Exiting.")
         log_heartbeat("failure", "Trends table empty. Analysis skipped.")
         return
 
-    performance = fix_missing_sources(performance)
-
-    # Compute CTR
-    for row in performance:
-        clicks = row.get("clicks", 0)
-        conversions = row.get("conversions", 0)
-        row["ctr"] = conversions / clicks if clicks else 0
-
-    # Organize by source
-    performance_by_source = {}
-    for row in performance:
-        src = row["source"]
-        performance_by_source.setdefault(src, []).append(row["ctr"])
-
-    # Calculate weights
-    avg_scores = {src: np.mean(scores) for src, scores in performance_by_source.items()}
-    max_score = max(avg_scores.values(), default=1)
-    new_weights = {src: (score / max_score) + 0.5 for src, score in avg_scores.items()}
-
-    # Update prompt_weights
-    for src, w in new_weights.items():
-        supabase.table("prompt_weights").upsert({
-            "source": src,
-            "weight": round(w, 2),
-            "performance_score": round(avg_scores[src], 4),
-            "last_analyzed": datetime.datetime.utcnow().isoformat()
-        }).execute()
-
-    log_heartbeat("success", f"Updated weights: {new_weights}")
+    aggregates = load_aggregates()
+    watermark = aggregates["last_performance_id"].dropna().max() if len(aggregates) else None
+    watermark = None if pd.isna(watermark) else int(watermark)
+
+    batch = compute_batch(watermark)
+    if batch.empty and watermark is None:
+        seed_fake_performance()
+        batch = compute_batch(None)
+
+    if batch.empty:
+        print("✅ No new performance rows after id", watermark)
+        log_heartbeat("info", f"No new performance rows after id {watermark}. Weights unchanged.")
+        return
+
+    new_rows = int(batch["sample_count"].sum())
+    aggregates = merge_aggregates(aggregates, batch)
+
+    # One bulk upsert for the sources that had new rows
+    records, new_weights = weight_records(aggregates, batch)
+    supabase.table("prompt_weights").upsert(records, on_conflict="source").execute()
+
+    log_heartbeat("success", f"Updated weights from {new_rows} new rows ({MODE} mode): {new_weights}")
     print("🔥 Updated weights:", new_weights)
 
 # ------------------------------
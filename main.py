@@ -6,12 +6,11 @@ and optional FastAPI endpoint for Render deployment.
 """
 
 import os
-import time
 import random
+import functools
 import traceback
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-import requests
 import asyncio
 
 # ------------------------------
@@ -21,6 +20,18 @@ load_dotenv()
 TREND_KEYWORDS = os.getenv("TREND_KEYWORDS", "python,ai").split(",")
 FETCH_INTERVAL = int(os.getenv("BONES_FETCH_INTERVAL", 600))  # default 10 min
 
+RETRY_DEADLINE = float(os.getenv("BONES_RETRY_DEADLINE", 90))  # seconds per retried call
+
+CONTENT_WORKERS = int(os.getenv("BONES_CONTENT_WORKERS", 4))  # concurrent content_queue consumers
+
+# Max blocking calls in flight per upstream source during a cycle
+SOURCE_CONCURRENCY = {
+    "twitter": int(os.getenv("BONES_TWITTER_CONCURRENCY", 2)),
+    "google_search": int(os.getenv("BONES_SEARCH_CONCURRENCY", 3)),
+    "trends": int(os.getenv("BONES_TRENDS_CONCURRENCY", 2)),
+    "supabase": int(os.getenv("BONES_SUPABASE_CONCURRENCY", 4)),
+}
+
 BLOOD_URLS = {
     "google_trends": os.getenv("BLOOD_GOOGLE_ENDPOINT", "http://blood:8000/save_trends"),
     "ollama_trends": os.getenv("BLOOD_OLLAMA_ENDPOINT", "http://blood:8000/save_ollama"),
@@ -31,38 +42,81 @@ BLOOD_URLS = {
 # ------------------------------
 # Internal modules
 # ------------------------------
-from heartbeat_logger import log_heartbeat, supabase
+from heartbeat_logger import log_heartbeat, shutdown_heartbeats, supabase
 from trends_fetcher import fetch_google_trends, save_to_supabase, fetch_ollama_trends
-from twitter_helper import search_tweets, save_tweets_to_supabase
+from twitter_helper import search_keywords, save_tweets_to_supabase, close_async_client
 from coingecko_helper import get_trending_coins
 from your_google_script import fetch_search_results, save_results_to_supabase
 from generate_content import generate_content
-from redis_manager import add_to_queue, pop_from_queue, cleanup
+from redis_manager import init_redis, add_to_queue, pop_from_queue, enqueue_reliable, consume, cleanup
+from retry_helper import retry_async
+from blood_delivery import push_records, flush_all, close_all
+
+# ------------------------------
+# Bounded offloading of blocking calls
+# ------------------------------
+_semaphores = {}
+
+def _semaphore(source):
+    if source not in _semaphores:
+        _semaphores[source] = asyncio.Semaphore(SOURCE_CONCURRENCY.get(source, 1))
+    return _semaphores[source]
+
+async def run_blocking(source, func, *args, **kwargs):
+    """
+    Run a blocking call in a worker thread so the event loop (and /status)
+    stays responsive, with at most SOURCE_CONCURRENCY[source] calls in flight.
+    The slot is held until the thread finishes: cancelling the await (e.g. a
+    retry deadline) cannot stop the thread, so it must not free the slot.
+    """
+    semaphore = _semaphore(source)
+    await semaphore.acquire()
+    try:
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    except BaseException:
+        semaphore.release()
+        raise
+
+    def release(done):
+        semaphore.release()
+        if not done.cancelled():
+            done.exception()  # retrieved, so an abandoned call's error isn't logged as unhandled
+
+    task.add_done_callback(release)
+    return await asyncio.shield(task)
 
 # ------------------------------
 # Retry wrapper
 # ------------------------------
-def retry(func, max_attempts=3, delay=5, *args, **kwargs):
-    for attempt in range(1, max_attempts + 1):
-        try:
-            result = func(*args, **kwargs)
-            log_heartbeat("success", f"{func.__name__} succeeded on attempt {attempt}", retries=attempt-1)
-            return result
-        except Exception as e:
-            log_heartbeat("error", f"Attempt {attempt}/{max_attempts} failed for {func.__name__}: {e}", retries=attempt)
-            if attempt < max_attempts:
-                time.sleep(delay + random.uniform(0, 2))
-            else:
-                log_heartbeat("failure", f"{func.__name__} permanently failed: {e}", retries=max_attempts)
-                raise e
+def _log_retry(name, attempt, exc, delay):
+    log_heartbeat("error", f"Attempt {attempt} failed for {name}: {exc}. Retrying in {delay:.1f}s", retries=attempt)
+
+def _log_giveup(name, attempt, exc):
+    log_heartbeat("failure", f"{name} permanently failed: {exc}", retries=attempt)
+
+async def retry(func, max_attempts=3, delay=5, *args, source="default", **kwargs):
+    """
+    Retry func with jittered exponential backoff without blocking the event loop.
+    Sync callables run through run_blocking(source, ...) on every attempt, so the
+    per-source semaphore is only held while a request is actually in flight.
+    """
+    if asyncio.iscoroutinefunction(func):
+        attempt_call = functools.partial(func, *args, **kwargs)
+    else:
+        async def attempt_call():
+            return await run_blocking(source, func, *args, **kwargs)
+
+    result = await retry_async(attempt_call, max_attempts=max_attempts, base_delay=delay,
+                               deadline=RETRY_DEADLINE, on_retry=_log_retry,
+                               on_giveup=_log_giveup, name=func.__name__)
+    log_heartbeat("success", f"{func.__name__} succeeded")
+    return result
 
 # ------------------------------
-# Push to Blood with retry
+# Push to Blood (batched, pooled, spooled on failure)
 # ------------------------------
-def push_to_blood(data, endpoint):
-    def _push():
-        requests.post(endpoint, json={"data": data})
-    retry(_push, max_attempts=3, delay=5)
+async def push_to_blood(data, endpoint):
+    await push_records(endpoint, data)
 
 # ------------------------------
 # Async versions for queues
@@ -81,16 +135,21 @@ async def async_cleanup():
 # ------------------------------
 async def seed_content_if_empty():
     try:
-        resp = supabase.table("content_performance").select("*").limit(1).execute()
+        resp = await run_blocking(
+            "supabase", lambda: supabase.table("content_performance").select("*").limit(1).execute()
+        )
         if not resp.data:
             log_heartbeat("info", "Seeding initial content...")
-            for kw in ["bitcoin", "ethereum", "zk rollup", "AI", "python"]:
+
+            async def seed(kw):
                 prompt = f"Generate content about '{kw}' prioritizing Google trends."
                 try:
-                    retry(generate_content, 3, 5, prompt)
+                    await retry(generate_content, 3, 5, prompt, source="supabase")
                     log_heartbeat("success", f"Seeded content for '{kw}'")
                 except Exception as e:
                     log_heartbeat("error", f"Seeding failed for '{kw}': {e}")
+
+            await asyncio.gather(*(seed(kw) for kw in ["bitcoin", "ethereum", "zk rollup", "AI", "python"]))
     except Exception as e:
         log_heartbeat("error", f"Seed check failed: {e}")
 
@@ -104,17 +163,83 @@ def build_prompt(keyword, source, weights):
 # ------------------------------
 # Retry queued content
 # ------------------------------
+async def process_queued_content(item):
+    try:
+        await retry(generate_content, 3, 5, item["prompt"], source="supabase")
+        log_heartbeat("success", f"Processed queued content for '{item['keyword']}'")
+    except Exception as e:
+        log_heartbeat("error", f"Retry failed for queued content '{item['keyword']}': {e}")
+        raise
+
 async def retry_queued_content():
-    while True:
-        item = await async_pop_from_queue("content_queue")
-        if not item:
-            break
-        try:
-            retry(generate_content, 3, 5, item["prompt"])
-            log_heartbeat("success", f"Processed queued content for '{item['keyword']}'")
-        except Exception as e:
-            await async_add_to_queue("content_queue", item)
-            log_heartbeat("error", f"Retry failed for queued content '{item['keyword']}': {e}")
+    # Reliable queue: failures go back with a delivery count and are
+    # dead-lettered into failed_pushes after max_deliveries
+    processed, failed = await consume("content_queue", process_queued_content, concurrency=CONTENT_WORKERS)
+    if processed or failed:
+        log_heartbeat("info", f"Content queue: {processed} processed, {failed} returned for retry")
+
+# ------------------------------
+# Per-source cycle stages
+# ------------------------------
+async def cycle_google_trends():
+    try:
+        google_trends = await retry(fetch_google_trends, 3, 5, TREND_KEYWORDS, source="trends")
+        if not google_trends.empty:
+            await asyncio.gather(
+                run_blocking("supabase", save_to_supabase, google_trends, table_name="google_trends"),
+                push_to_blood(google_trends.to_dict(orient="records"), BLOOD_URLS["google_trends"]),
+            )
+            log_heartbeat("success", f"Fetched and pushed {len(google_trends)} Google Trends")
+    except Exception as e:
+        log_heartbeat("error", f"Google Trends cycle failed: {e}")
+
+async def cycle_ollama_trends():
+    try:
+        ollama_trends = await retry(fetch_ollama_trends, 3, 5, source="trends")
+        if not ollama_trends.empty:
+            await asyncio.gather(
+                run_blocking("supabase", save_to_supabase, ollama_trends, table_name="ollama_trends"),
+                push_to_blood(ollama_trends.to_dict(orient="records"), BLOOD_URLS["ollama_trends"]),
+            )
+            log_heartbeat("success", f"Fetched and pushed {len(ollama_trends)} Ollama Trends")
+    except Exception as e:
+        log_heartbeat("error", f"Ollama Trends cycle failed: {e}")
+
+async def cycle_twitter(keywords):
+    """All keywords in as few OR-joined queries as fit; never waits on the rate window."""
+    try:
+        found = await search_keywords(keywords)
+        tweets = found["tweets"]
+        await asyncio.gather(
+            run_blocking("supabase", save_tweets_to_supabase, tweets, marks=found["marks"]),
+            push_to_blood(tweets, BLOOD_URLS["twitter"]),
+        )
+        rate = found["rate"]
+        log_heartbeat("info", f"Fetched {len(tweets)} tweets for {len(keywords)} keywords "
+                              f"(rate budget {rate.get('remaining', '?')}/{rate.get('limit', '?')})")
+        if found["skipped"]:
+            log_heartbeat("error", f"Twitter rate window spent; skipped {found['skipped']} until next cycle")
+    except Exception as e:
+        log_heartbeat("error", f"Twitter fetch/save failed for {keywords}: {e}")
+
+async def cycle_google_search(kw):
+    try:
+        results = await retry(fetch_search_results, 3, 5, kw, source="google_search")
+        await asyncio.gather(
+            run_blocking("supabase", save_results_to_supabase, results, kw),
+            push_to_blood(results, BLOOD_URLS["search_results"]),
+        )
+    except Exception as e:
+        log_heartbeat("error", f"Google search fetch/save failed for '{kw}': {e}")
+
+async def cycle_keyword(kw, weights_dict, sources):
+    await cycle_google_search(kw)
+
+    # Adaptive prompt & queue
+    selected_source = random.choices(sources, weights=[weights_dict.get(s, 1.0) for s in sources], k=1)[0]
+    prompt = build_prompt(kw, selected_source, weights_dict)
+    await enqueue_reliable("content_queue", [{"keyword": kw, "prompt": prompt}])
+    log_heartbeat("info", f"Queued content prompt for '{kw}'")
 
 # ------------------------------
 # Main fetch & push cycle
@@ -124,58 +249,25 @@ async def run_cycle():
         await seed_content_if_empty()
         await async_cleanup()
 
-        # Fetch trending keywords
-        keywords = get_trending_coins()[:3] + ["bitcoin", "zk rollup"]
-        weights_resp = supabase.table("prompt_weights").select("*").execute()
+        # Fetch trending keywords and prompt weights together
+        trending, weights_resp = await asyncio.gather(
+            run_blocking("trends", get_trending_coins),
+            run_blocking("supabase", lambda: supabase.table("prompt_weights").select("*").execute()),
+        )
+        keywords = trending[:3] + ["bitcoin", "zk rollup"]
         weights_dict = {item["source"]: item["weight"] for item in (weights_resp.data or [])}
         sources = ["Twitter", "Google", "Reddit", "Medium"]
 
-        # --- Google Trends ---
-        try:
-            google_trends = retry(fetch_google_trends, 3, 5, TREND_KEYWORDS)
-            if not google_trends.empty:
-                save_to_supabase(google_trends, table_name="google_trends")
-                push_to_blood(google_trends.to_dict(orient="records"), BLOOD_URLS["google_trends"])
-                log_heartbeat("success", f"Fetched and pushed {len(google_trends)} Google Trends")
-        except Exception as e:
-            log_heartbeat("error", f"Google Trends cycle failed: {e}")
-
-        # --- Ollama Trends ---
-        try:
-            ollama_trends = retry(fetch_ollama_trends, 3, 5)
-            if not ollama_trends.empty:
-                save_to_supabase(ollama_trends, table_name="ollama_trends")
-                push_to_blood(ollama_trends.to_dict(orient="records"), BLOOD_URLS["ollama_trends"])
-                log_heartbeat("success", f"Fetched and pushed {len(ollama_trends)} Ollama Trends")
-        except Exception as e:
-            log_heartbeat("error", f"Ollama Trends cycle failed: {e}")
-
-        # --- Keyword loop ---
-        for kw in keywords:
-            # Twitter
-            try:
-                tweets = retry(search_tweets, 3, 5, kw)
-                save_tweets_to_supabase(tweets)
-                push_to_blood([t.to_dict() for t in tweets], BLOOD_URLS["twitter"])
-            except Exception as e:
-                log_heartbeat("error", f"Twitter fetch/save failed for '{kw}': {e}")
-
-            # Google search
-            try:
-                results = retry(fetch_search_results, 3, 5, kw)
-                save_results_to_supabase(results, kw)
-                push_to_blood(results, BLOOD_URLS["search_results"])
-            except Exception as e:
-                log_heartbeat("error", f"Google search fetch/save failed for '{kw}': {e}")
-
-            # Adaptive prompt & queue
-            selected_source = random.choices(sources, weights=[weights_dict.get(s, 1.0) for s in sources], k=1)[0]
-            prompt = build_prompt(kw, selected_source, weights_dict)
-            await async_add_to_queue("content_queue", {"keyword": kw, "prompt": prompt})
-            log_heartbeat("info", f"Queued content prompt for '{kw}'")
-
-        # Retry queued content
-        await retry_queued_content()
+        # --- Google Trends, Ollama Trends, Twitter and keyword loop run concurrently ---
+        await asyncio.gather(
+            cycle_google_trends(),
+            cycle_ollama_trends(),
+            cycle_twitter(keywords),
+            *(cycle_keyword(kw, weights_dict, sources) for kw in keywords),
+        )
+
+        # Retry queued content while the last Blood batches drain
+        await asyncio.gather(retry_queued_content(), flush_all())
 
         log_heartbeat("success", "Cycle completed successfully.")
     except Exception as e:
@@ -187,6 +279,7 @@ async def run_cycle():
 # ------------------------------
 async def main_loop():
     print(f"🦴 bones autonomous collector started (interval: {FETCH_INTERVAL}s)")
+    await init_redis()
     while True:
         start_time = datetime.now(timezone.utc).isoformat()
         log_heartbeat("info", f"Starting cycle at {start_time}")
@@ -201,6 +294,17 @@ from fastapi import FastAPI
 
 app = FastAPI()
 
+@app.on_event("startup")
+async def start_collector():
+    # Run the collector on uvicorn's own event loop so cycles and /status share it
+    app.state.collector = asyncio.create_task(main_loop())
+
+@app.on_event("shutdown")
+async def stop_collector():
+    app.state.collector.cancel()
+    await asyncio.gather(close_all(), close_async_client())
+    await asyncio.to_thread(shutdown_heartbeats)
+
 @app.get("/status")
 async def status():
     return {"ok": True, "message": "Bones is running"}
@@ -212,10 +316,5 @@ if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
 
-    loop = asyncio.get_event_loop()
-
-    # Schedule autonomous collector in background
-    loop.create_task(main_loop())
-
-    # Run FastAPI server (blocks)
+    # Run FastAPI server (blocks); the collector starts on its startup hook
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,74 @@
+# model_registry.py
+"""
+Process-wide registry of lazily loaded ML models.
+
+Nothing is imported or loaded until get_model() is first called for a
+name, so entry points only pay for the models they actually touch.
+warm_up() loads models ahead of time (e.g. in a background thread while
+feeds download).
+"""
+
+import time
+import threading
+
+SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+SPACY_MODEL_NAME = "en_core_web_sm"
+# Only tok2vec + ner are needed for entity extraction
+SPACY_DISABLED_PIPES = ["parser", "lemmatizer", "tagger", "attribute_ruler", "senter"]
+
+_loaders = {}
+_models = {}
+_lock = threading.Lock()
+
+
+def register_model(name, loader):
+    """Register a zero-argument loader under name (replaces any previous one)."""
+    _loaders[name] = loader
+
+
+def get_model(name):
+    """Return the model, loading it on first use (thread-safe, loaded once)."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        if name not in _models:
+            started = time.perf_counter()
+            _models[name] = _loaders[name]()
+            print(f"[Models] Loaded {name} in {time.perf_counter() - started:.2f}s")
+        return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def loaded_models():
+    return sorted(_models)
+
+
+def warm_up(*names):
+    """Load the given models (default: every registered one). Returns load times in seconds."""
+    timings = {}
+    for name in names or list(_loaders):
+        started = time.perf_counter()
+        get_model(name)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+# ------------------------------
+# Built-in loaders
+# ------------------------------
+def _load_sentence_transformer():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(SENTENCE_MODEL_NAME)
+
+
+def _load_spacy_ner():
+    import spacy
+    return spacy.load(SPACY_MODEL_NAME, disable=SPACY_DISABLED_PIPES)
+
+
+register_model("sentence_transformer", _load_sentence_transformer)
+register_model("spacy_ner", _load_spacy_ner)
@@ -0,0 +1,79 @@
+# performance_rpc.py
+"""
+Server-side per-source aggregation for loop_closer.
+
+source_performance_v2 (sql/004_performance_id_watermark.sql) aggregates
+content_performance in Postgres and returns one row per source, so a
+weight update costs one small response however many rows exist.
+SQLiteSourcePerformance implements the same contract over a local SQLite
+table for tests only.
+"""
+
+import sqlite3
+
+import pandas as pd
+
+RPC_NAME = "source_performance_v2"
+
+BATCH_COLUMNS = ["source", "sample_count", "clicks_sum", "conversions_sum", "revenue_sum",
+                 "ctr_sum", "first_ctr", "ctr_contrib", "decay", "last_recorded_at", "last_performance_id"]
+
+# Same query as the Postgres function, in SQLite's dialect
+SQLITE_SOURCE_PERFORMANCE = """
+WITH scored AS (
+    SELECT
+        id,
+        source,
+        CAST(COALESCE(clicks, 0) AS REAL)      AS clicks,
+        CAST(COALESCE(conversions, 0) AS REAL) AS conversions,
+        CAST(COALESCE(revenue, 0) AS REAL)     AS revenue,
+        recorded_at,
+        CASE WHEN clicks > 0 THEN CAST(conversions AS REAL) / clicks ELSE 0 END AS ctr,
+        ROW_NUMBER() OVER (PARTITION BY source ORDER BY id DESC) - 1 AS age,
+        ROW_NUMBER() OVER (PARTITION BY source ORDER BY id) AS pos
+    FROM content_performance
+    WHERE (:p_after_id IS NULL OR id > :p_after_id)
+      AND COALESCE(source, '') <> ''
+)
+SELECT
+    source,
+    COUNT(*)                                           AS sample_count,
+    SUM(clicks)                                        AS clicks_sum,
+    SUM(conversions)                                   AS conversions_sum,
+    SUM(revenue)                                       AS revenue_sum,
+    SUM(ctr)                                           AS ctr_sum,
+    MAX(CASE WHEN pos = 1 THEN ctr END)                AS first_ctr,
+    SUM(:p_alpha * rpc_power(1 - :p_alpha, age) * ctr) AS ctr_contrib,
+    rpc_power(1 - :p_alpha, COUNT(*))                  AS decay,
+    MAX(recorded_at)                                   AS last_recorded_at,
+    MAX(id)                                            AS last_performance_id
+FROM scored
+GROUP BY source
+"""
+
+
+def to_batch_frame(rows):
+    """RPC rows -> DataFrame indexed by source (empty frame when there are none)."""
+    batch = pd.DataFrame(rows, columns=BATCH_COLUMNS).set_index("source")
+    numeric = [col for col in BATCH_COLUMNS if col not in ("source", "last_recorded_at")]
+    batch[numeric] = batch[numeric].apply(pd.to_numeric)
+    return batch
+
+
+def rpc_source_performance(client, after_id=None, alpha=0.1):
+    """Per-source aggregates for rows inserted after after_id, computed in Postgres."""
+    rows = client.rpc(RPC_NAME, {"p_after_id": after_id, "p_alpha": alpha}).execute().data
+    return to_batch_frame(rows or [])
+
+
+class SQLiteSourcePerformance:
+    """Local stand-in for source_performance_v2 over a content_performance table."""
+
+    def __init__(self, conn):
+        self.conn = conn if isinstance(conn, sqlite3.Connection) else sqlite3.connect(conn)
+        # power() is only built in when SQLite has math functions compiled in
+        self.conn.create_function("rpc_power", 2, lambda base, exp: float(base) ** exp, deterministic=True)
+
+    def __call__(self, after_id=None, alpha=0.1):
+        cursor = self.conn.execute(SQLITE_SOURCE_PERFORMANCE, {"p_after_id": after_id, "p_alpha": alpha})
+        return to_batch_frame(cursor.fetchall())
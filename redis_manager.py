@@ -1,6 +1,8 @@
 # redis_manager_async.py
 import os
 import json
+import time
+import uuid
 import asyncio
 from redis.asyncio import Redis
 
@@ -12,24 +14,124 @@ UPSTASH_TOKEN = os.getenv("UPSTASH_TOKEN")  # Optional if using rediss:// URL
 
 r: Redis = None  # Will initialize in async function
 
+# -------------------------
+# Server-side scripts
+# -------------------------
+# LPUSH + EXPIRE + conditional LTRIM in one round trip.
+# KEYS[1]=queue  ARGV[1]=ttl  ARGV[2]=soft limit  ARGV[3]=max size  ARGV[4..]=payloads
+ENQUEUE_LUA = """
+local n = redis.call('LPUSH', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if n > tonumber(ARGV[2]) then
+    redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[3]) - 1)
+    n = math.min(n, tonumber(ARGV[3]))
+end
+return n
+"""
+
+ENQUEUE_CHUNK = 1000  # keep unpack() well under Lua's stack limit
+
+# Reliable queues keep reserved items in <queue>:inflight (ZSET scored by
+# visibility deadline) and delivery counts in <queue>:deliveries (HASH by id).
+# release() puts an item back on the queue, or dead-letters it once it has
+# been delivered max_deliveries times.
+# KEYS[1]=queue  KEYS[2]=inflight  KEYS[3]=deliveries  KEYS[4]=dead letter queue
+_RELEASE_LUA = """
+local function item_id(item)
+    local ok, env = pcall(cjson.decode, item)
+    if ok and type(env) == 'table' and env.id then return env.id end
+    return item
+end
+local function release(item, max_deliveries, dead_ttl)
+    local id = item_id(item)
+    local count = tonumber(redis.call('HGET', KEYS[3], id) or '0')
+    if count >= max_deliveries then
+        redis.call('LPUSH', KEYS[4], item)
+        redis.call('EXPIRE', KEYS[4], dead_ttl)
+        redis.call('HDEL', KEYS[3], id)
+        return 'dead'
+    end
+    redis.call('LPUSH', KEYS[1], item)
+    return 'requeued'
+end
+"""
+
+# Requeue expired leases, then pop the oldest item and lease it.
+# ARGV[1]=now  ARGV[2]=visibility timeout  ARGV[3]=max deliveries  ARGV[4]=dead letter ttl  ARGV[5]=ttl
+RESERVE_LUA = _RELEASE_LUA + """
+local now = tonumber(ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, 100)
+for _, item in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], item)
+    release(item, tonumber(ARGV[3]), ARGV[4])
+end
+local item = redis.call('RPOP', KEYS[1])
+if not item then return nil end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), item)
+local count = redis.call('HINCRBY', KEYS[3], item_id(item), 1)
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return {item, count}
+"""
+
+# Give a leased item back (failed processing).
+# ARGV[1]=raw item  ARGV[2]=max deliveries  ARGV[3]=dead letter ttl
+NACK_LUA = _RELEASE_LUA + """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then return 'expired' end
+return release(ARGV[1], tonumber(ARGV[2]), ARGV[3])
+"""
+
+_enqueue_script = None
+_reserve_script = None
+_nack_script = None
+
 async def init_redis():
-    global r
+    global r, _enqueue_script, _reserve_script, _nack_script
     r = Redis.from_url(
         UPSTASH_URL,
         decode_responses=True,
         username="default",
         password=UPSTASH_TOKEN
     )
+    _enqueue_script = r.register_script(ENQUEUE_LUA)
+    _reserve_script = r.register_script(RESERVE_LUA)
+    _nack_script = r.register_script(NACK_LUA)
     print("Redis connection established.")
 
+_sync_r = None
+
+def sync_client():
+    """
+    Blocking client for code that runs in worker threads (API helpers,
+    scripts). Returns None when UPSTASH_URL is not configured.
+    """
+    global _sync_r
+    if _sync_r is None and UPSTASH_URL:
+        from redis import Redis as SyncRedis
+        _sync_r = SyncRedis.from_url(
+            UPSTASH_URL,
+            decode_responses=True,
+            username="default",
+            password=UPSTASH_TOKEN
+        )
+    return _sync_r
+
 # -------------------------
 # Config per queue
 # -------------------------
 QUEUES_CONFIG = {
     "default_queue": {"max_size": 200, "ttl": 86400},  # 24 hours
     "failed_pushes": {"max_size": 100, "ttl": 604800}, # 7 days
+    "content_queue": {
+        "max_size": 200, "ttl": 86400,
+        "visibility_timeout": 300,        # seconds a reserved item stays invisible
+        "max_deliveries": 5,              # then it is dead-lettered
+        "dead_letter": "failed_pushes",
+    },
 }
 
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_MAX_DELIVERIES = 5
+
 AUTOMATIC_CLEAN_INTERVAL = 300  # 5 minutes
 MAX_MEMORY_BYTES = 256 * 1024 * 1024  # 256 MB
 SOFT_EVICTION_RATIO = 0.8
@@ -37,14 +139,31 @@ SOFT_EVICTION_RATIO = 0.8
 # -------------------------
 # Queue helpers
 # -------------------------
+def _queue_config(queue_name: str):
+    return QUEUES_CONFIG.get(queue_name, {"max_size": 100, "ttl": 86400})
+
+async def add_many(queue_name: str, items: list):
+    """Enqueue items (LPUSH, refresh TTL, soft trim) in one round trip per chunk."""
+    if not items:
+        return 0
+    cfg = _queue_config(queue_name)
+    soft_limit = int(cfg["max_size"] * SOFT_EVICTION_RATIO)
+    length = 0
+    for start in range(0, len(items), ENQUEUE_CHUNK):
+        payloads = [json.dumps(data, separators=(",", ":")) for data in items[start:start + ENQUEUE_CHUNK]]
+        length = await _enqueue_script(
+            keys=[queue_name],
+            args=[cfg["ttl"], soft_limit, cfg["max_size"], *payloads],
+        )
+    return length
+
 async def add_to_queue(queue_name: str, data: dict):
-    cfg = QUEUES_CONFIG.get(queue_name, {"max_size": 100, "ttl": 86400})
-    payload = json.dumps(data, separators=(",", ":"))
-    await r.lpush(queue_name, payload)
-    await r.expire(queue_name, cfg["ttl"])
+    return await add_many(queue_name, [data])
 
-    if await r.llen(queue_name) > int(cfg["max_size"] * SOFT_EVICTION_RATIO):
-        await trim_queue(queue_name, cfg["max_size"])
+async def pop_many(queue_name: str, count: int):
+    """Pop up to count oldest items in a single RPOP (Redis >= 6.2)."""
+    items = await r.rpop(queue_name, count) or []
+    return [json.loads(item) for item in items]
 
 async def pop_from_queue(queue_name: str):
     item = await r.rpop(queue_name)
@@ -53,22 +172,122 @@ async def pop_from_queue(queue_name: str):
 async def trim_queue(queue_name: str, max_size: int):
     await r.ltrim(queue_name, 0, max_size - 1)
 
+async def trim_queues(limits: dict):
+    """Trim several queues (name -> max items kept, newest first) in one pipelined call."""
+    async with r.pipeline(transaction=False) as pipe:
+        for queue_name, keep in limits.items():
+            pipe.ltrim(queue_name, 0, max(int(keep), 0) - 1)
+        await pipe.execute()
+
+# -------------------------
+# Reliable (at-least-once) queue
+# -------------------------
+def _reliable_keys(queue_name: str):
+    cfg = _queue_config(queue_name)
+    dead_letter = cfg.get("dead_letter", "failed_pushes")
+    return [queue_name, f"{queue_name}:inflight", f"{queue_name}:deliveries", dead_letter]
+
+async def enqueue_reliable(queue_name: str, items: list):
+    """Enqueue items wrapped in an {"id", "data"} envelope so they can be acked."""
+    return await add_many(queue_name, [{"id": uuid.uuid4().hex, "data": data} for data in items])
+
+async def reserve(queue_name: str):
+    """
+    Lease the oldest item for visibility_timeout seconds. Returns a job dict
+    ({"id", "data", "deliveries", "raw"}) or None. Unacked jobs reappear on
+    the queue once their lease expires; after max_deliveries they move to
+    the dead letter queue.
+    """
+    cfg = _queue_config(queue_name)
+    result = await _reserve_script(
+        keys=_reliable_keys(queue_name),
+        args=[
+            time.time(),
+            cfg.get("visibility_timeout", DEFAULT_VISIBILITY_TIMEOUT),
+            cfg.get("max_deliveries", DEFAULT_MAX_DELIVERIES),
+            _queue_config(cfg.get("dead_letter", "failed_pushes"))["ttl"],
+            cfg["ttl"],
+        ],
+    )
+    if not result:
+        return None
+    raw, deliveries = result
+    envelope = json.loads(raw)
+    if not (isinstance(envelope, dict) and "id" in envelope and "data" in envelope):
+        envelope = {"id": raw, "data": envelope}  # item enqueued without an envelope
+    return {"id": envelope["id"], "data": envelope["data"], "deliveries": int(deliveries), "raw": raw}
+
+async def ack(queue_name: str, job: dict):
+    """Mark a reserved job as done."""
+    _, inflight, deliveries, _ = _reliable_keys(queue_name)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.zrem(inflight, job["raw"])
+        pipe.hdel(deliveries, job["id"])
+        await pipe.execute()
+
+async def nack(queue_name: str, job: dict):
+    """Return a failed job to the back of the queue, or dead-letter it."""
+    cfg = _queue_config(queue_name)
+    return await _nack_script(
+        keys=_reliable_keys(queue_name),
+        args=[
+            job["raw"],
+            cfg.get("max_deliveries", DEFAULT_MAX_DELIVERIES),
+            _queue_config(cfg.get("dead_letter", "failed_pushes"))["ttl"],
+        ],
+    )
+
+async def consume(queue_name: str, handler, concurrency: int = 4, max_items: int = None):
+    """
+    Run up to `concurrency` consumers that reserve jobs and await handler(data),
+    acking on success and nacking on error. Processes at most max_items jobs
+    (default: the queue length plus expired leases at start, so leases are
+    reclaimed even when the queue itself is empty), so failing items are not
+    retried in a tight loop within one call. Returns (processed, failed).
+    """
+    if max_items is None:
+        _, inflight, _, _ = _reliable_keys(queue_name)
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.llen(queue_name)
+            pipe.zcount(inflight, "-inf", time.time())
+            queued, expired = await pipe.execute()
+        max_items = queued + expired
+    budget = {"left": max_items, "processed": 0, "failed": 0}
+
+    async def worker():
+        while budget["left"] > 0:
+            budget["left"] -= 1
+            job = await reserve(queue_name)
+            if job is None:
+                return
+            try:
+                await handler(job["data"])
+            except Exception:
+                budget["failed"] += 1
+                await nack(queue_name, job)
+            else:
+                budget["processed"] += 1
+                await ack(queue_name, job)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return budget["processed"], budget["failed"]
+
 # -------------------------
 # Cleanup
 # -------------------------
 async def cleanup():
-    for queue_name, cfg in QUEUES_CONFIG.items():
-        if await r.llen(queue_name) > cfg["max_size"]:
-            await trim_queue(queue_name, cfg["max_size"])
+    # Hard cap every queue (LTRIM is a no-op on shorter lists) and read memory in one round trip
+    async with r.pipeline(transaction=False) as pipe:
+        for queue_name, cfg in QUEUES_CONFIG.items():
+            pipe.ltrim(queue_name, 0, cfg["max_size"] - 1)
+        pipe.info("memory")
+        results = await pipe.execute()
 
     # Optional memory-aware cleanup
-    info = await r.info()
-    used_memory = info.get("used_memory", 0)
+    used_memory = results[-1].get("used_memory", 0)
     if used_memory > MAX_MEMORY_BYTES * 0.9:
         print(f"[Warning] Redis memory {used_memory} exceeds 90% of limit. Soft trimming queues...")
-        for queue_name, cfg in QUEUES_CONFIG.items():
-            while await r.llen(queue_name) > int(cfg["max_size"] * 0.5):
-                await r.rpop(queue_name)
+        await trim_queues({name: int(cfg["max_size"] * 0.5) for name, cfg in QUEUES_CONFIG.items()})
 
 # -------------------------
 # Background cleanup loop
@@ -82,8 +301,11 @@ async def background_cleanup_loop():
 # Monitoring
 # -------------------------
 async def print_queue_status():
-    for queue_name in QUEUES_CONFIG:
-        count = await r.llen(queue_name)
+    async with r.pipeline(transaction=False) as pipe:
+        for queue_name in QUEUES_CONFIG:
+            pipe.llen(queue_name)
+        counts = await pipe.execute()
+    for queue_name, count in zip(QUEUES_CONFIG, counts):
         print(f"{queue_name}: {count} items")
 
 # -------------------------
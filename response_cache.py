@@ -0,0 +1,79 @@
+# response_cache.py
+"""
+HTTP response cache for the read API.
+
+Entries are keyed by path + sorted query parameters + the articles
+generation that db.save_articles bumps on every write, so a new ingest
+invalidates everything at once without explicit purges. The ETag is
+derived from the same key, so If-None-Match can be answered with a 304
+before any query runs. An in-process LRU is the first tier; when
+redis_manager has a live connection it is used as a shared second tier.
+"""
+
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+import redis_manager
+
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", 1024))
+REDIS_CACHE_TTL = int(os.getenv("API_CACHE_REDIS_TTL", 3600))  # seconds
+REDIS_PREFIX = "api_cache:"
+
+
+def cache_key(request, generation):
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{params}#g{generation}"
+
+def make_etag(key):
+    return '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+class ResponseCache:
+    """LRU of (body bytes, extra headers), optionally backed by Redis."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        r = redis_manager.r
+        if r is not None:
+            try:
+                raw = await r.get(REDIS_PREFIX + key)
+            except Exception as e:
+                print(f"[Cache] Redis get failed: {e}")
+                raw = None
+            if raw:
+                cached = json.loads(raw)
+                entry = (cached["body"].encode(), cached["headers"])
+                self._store(key, entry)
+                return entry
+        return None
+
+    async def set(self, key, body, headers):
+        self._store(key, (body, headers))
+        r = redis_manager.r
+        if r is not None:
+            try:
+                payload = json.dumps({"body": body.decode(), "headers": headers})
+                await r.set(REDIS_PREFIX + key, payload, ex=REDIS_CACHE_TTL)
+            except Exception as e:
+                print(f"[Cache] Redis set failed: {e}")
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,214 @@
+# retry_helper.py
+"""
+Retry/backoff helpers shared by the collectors.
+
+Exponential backoff with full jitter, retry classification (retry on
+429/5xx/timeouts, fail fast on other 4xx), Retry-After support and a
+per-call deadline budget. Coroutines sleep with asyncio.sleep so a flaky
+upstream never freezes the event loop.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 1.0   # seconds
+DEFAULT_MAX_DELAY = 30.0   # seconds
+DEFAULT_DEADLINE = 60.0    # seconds, whole call including sleeps
+
+# Transport-level failures worth retrying, collected from whichever clients are installed
+TRANSIENT_ERRORS = [TimeoutError, ConnectionError, asyncio.TimeoutError]
+try:
+    import requests
+    TRANSIENT_ERRORS += [requests.Timeout, requests.ConnectionError]
+except ImportError:
+    pass
+try:
+    import httpx
+    TRANSIENT_ERRORS += [httpx.TransportError]
+except ImportError:
+    pass
+TRANSIENT_ERRORS = tuple(TRANSIENT_ERRORS)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the retry budget runs out before a call succeeds."""
+
+
+# ------------------------------
+# Classification
+# ------------------------------
+def _response(exc):
+    return getattr(exc, "response", None)
+
+def get_status(exc):
+    """HTTP status carried by an exception (requests, httpx, tweepy, pytrends), if any."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = _response(exc)
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    return status if isinstance(status, int) else None
+
+def get_retry_after(exc):
+    """Seconds the server asked us to wait (Retry-After or x-rate-limit-reset), if any."""
+    headers = getattr(_response(exc), "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(value)
+                return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                return None
+
+    reset = headers.get("x-rate-limit-reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            return None
+    return None
+
+def is_retryable(exc):
+    """Retry on 429/5xx and transport timeouts, fail fast on other 4xx."""
+    status = get_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, TRANSIENT_ERRORS):
+        return True
+    # Unknown failures keep the old behaviour of being retried
+    return not isinstance(exc, (TypeError, ValueError, KeyError, AttributeError))
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """Full jitter: uniform in [0, min(max_delay, base_delay * 2**(attempt-1))]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+def _next_delay(exc, attempt, base_delay, max_delay, started, deadline):
+    """Delay before the next attempt, or None if the deadline budget does not allow one."""
+    delay = backoff_delay(attempt, base_delay, max_delay)
+    retry_after = get_retry_after(exc)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    if deadline is not None and time.monotonic() - started + delay >= deadline:
+        return None
+    return delay
+
+def _remaining(started, deadline):
+    if deadline is None:
+        return None
+    return deadline - (time.monotonic() - started)
+
+# ------------------------------
+# Core loops
+# ------------------------------
+async def retry_async(func, args=(), kwargs=None, *, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                      base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                      deadline=DEFAULT_DEADLINE, retry_on=is_retryable,
+                      on_retry=None, on_giveup=None, name=None):
+    """
+    Call func(*args, **kwargs) until it succeeds, the error is not retryable,
+    attempts run out or the deadline budget is spent.
+
+    Sync callables run in a worker thread; coroutine functions are awaited.
+    on_retry(name, attempt, exc, delay) and on_giveup(name, attempt, exc) are
+    optional hooks for logging.
+    """
+    kwargs = kwargs or {}
+    name = name or getattr(func, "__name__", repr(func))
+    started = time.monotonic()
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            if asyncio.iscoroutinefunction(func):
+                call = func(*args, **kwargs)
+            else:
+                call = asyncio.to_thread(func, *args, **kwargs)
+            remaining = _remaining(started, deadline)
+            if remaining is not None and remaining <= 0:
+                call.close()
+                raise DeadlineExceeded(f"{name} exceeded its {deadline}s retry budget")
+            return await asyncio.wait_for(call, timeout=remaining)
+        except Exception as e:
+            delay = None
+            if attempt < max_attempts and retry_on(e):
+                delay = _next_delay(e, attempt, base_delay, max_delay, started, deadline)
+            if delay is None:
+                if on_giveup:
+                    on_giveup(name, attempt, e)
+                raise
+            if on_retry:
+                on_retry(name, attempt, e, delay)
+            await asyncio.sleep(delay)
+
+def retry_sync(func, args=(), kwargs=None, *, max_attempts=DEFAULT_MAX_ATTEMPTS,
+               base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+               deadline=DEFAULT_DEADLINE, retry_on=is_retryable,
+               on_retry=None, on_giveup=None, name=None):
+    """
+    Blocking counterpart of retry_async for helpers that already run in a
+    worker thread (or in standalone scripts). Sleeps with time.sleep.
+    """
+    kwargs = kwargs or {}
+    name = name or getattr(func, "__name__", repr(func))
+    started = time.monotonic()
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            delay = None
+            if attempt < max_attempts and retry_on(e):
+                delay = _next_delay(e, attempt, base_delay, max_delay, started, deadline)
+            if delay is None:
+                if on_giveup:
+                    on_giveup(name, attempt, e)
+                raise
+            if on_retry:
+                on_retry(name, attempt, e, delay)
+            time.sleep(delay)
+
+# ------------------------------
+# Decorator
+# ------------------------------
+def retryable(max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+              max_delay=DEFAULT_MAX_DELAY, deadline=DEFAULT_DEADLINE,
+              retry_on=is_retryable, on_retry=None, on_giveup=None):
+    """
+    Decorate a function with retry/backoff. Coroutine functions get the
+    asyncio loop (never blocking the event loop); plain functions get the
+    blocking loop and are expected to run off the event loop.
+
+        @retryable(max_attempts=4, deadline=30)
+        def fetch(...): ...
+    """
+    policy = dict(max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay,
+                  deadline=deadline, retry_on=retry_on, on_retry=on_retry, on_giveup=on_giveup)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await retry_async(func, args, kwargs, name=func.__name__, **policy)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            return retry_sync(func, args, kwargs, name=func.__name__, **policy)
+        return sync_wrapper
+
+    return decorator
+
+def log_retry(name, attempt, exc, delay):
+    """Default on_retry hook for scripts without heartbeat logging."""
+    print(f"[Retry] {name} attempt {attempt} failed: {exc}. Retrying in {delay:.1f}s")
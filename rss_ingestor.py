@@ -1,17 +1,36 @@
 import feedparser
 import re
+import os
 import json
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 from datetime import datetime, timezone
 import emoji
 import hashlib
-import spacy
+from collections import OrderedDict
+from model_registry import get_model, warm_up
 
 from coingecko_helper import get_trending_coins  # <-- import CoinGecko helper
 
-# Load SpaCy model for entity recognition
-nlp = spacy.load("en_core_web_sm")
+# Fastest available HTML parser: selectolax, then lxml, then the stdlib parser
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+try:
+    import lxml  # noqa: F401
+    BS4_PARSER = "lxml"
+except ImportError:
+    BS4_PARSER = "html.parser"
+
+# SpaCy NER model (tok2vec + ner only) is loaded on first use via model_registry
+NER_LABELS = {"ORG", "PERSON", "GPE", "PRODUCT", "EVENT"}
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", 128))
+NER_PROCESSES = int(os.getenv("NER_PROCESSES", 1))            # >1 enables nlp.pipe multiprocessing
+NER_MULTIPROCESS_MIN = int(os.getenv("NER_MULTIPROCESS_MIN", 2000))  # batch size worth forking for
+NER_CACHE_SIZE = 20000
+CLEAN_CACHE_SIZE = 20000
 
 # List of RSS feeds
 FEED_URLS = [
@@ -23,21 +42,85 @@ FEED_URLS = [
     "https://www.reutersagency.com/feed/?best-sectors=business"
 ]
 
+# Conditional-GET validators and seen entry ids, persisted between runs
+FEED_STATE_FILE = "rss_feed_state.json"
+OUTPUT_FILE = "cleaned_rss_output.json"
+MAX_SEEN_PER_FEED = 1000
+
+FETCH_TIMEOUT = 20           # seconds
+MAX_CONNECTIONS = 50         # across all hosts
+PER_HOST_CONCURRENCY = 2     # simultaneous requests to one host
+USER_AGENT = "bones-rss-ingestor/1.0"
+
+def content_hash(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+# raw-text hash -> cleaned text, so syndicated summaries are cleaned once
+_clean_cache = OrderedDict()
+
+def _html_to_text(text):
+    if "<" not in text and "&" not in text:
+        return text  # plain text, nothing to parse
+    if HTMLParser is not None:
+        return HTMLParser(text).text(separator="")
+    return BeautifulSoup(text, BS4_PARSER).get_text()
+
 def clean_html(text):
-    soup = BeautifulSoup(text, "html.parser")
-    text = soup.get_text()
-    text = emoji.replace_emoji(text, "")
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+    key = content_hash(text)
+    if key in _clean_cache:
+        _clean_cache.move_to_end(key)
+        return _clean_cache[key]
 
-def extract_keywords(text):
-    doc = nlp(text)
-    keywords = list({ent.text.lower() for ent in doc.ents if ent.label_ in ["ORG", "PERSON", "GPE", "PRODUCT", "EVENT"]})
+    cleaned = _html_to_text(text)
+    cleaned = emoji.replace_emoji(cleaned, "")
+    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+
+    _clean_cache[key] = cleaned
+    if len(_clean_cache) > CLEAN_CACHE_SIZE:
+        _clean_cache.popitem(last=False)
+    return cleaned
+
+# content hash -> keywords, shared across feeds and runs in this process
+_keyword_cache = OrderedDict()
+
+def _keywords_from_doc(doc, text):
+    keywords = list({ent.text.lower() for ent in doc.ents if ent.label_ in NER_LABELS})
     # Add regex-based crypto ticker extraction
     tickers = re.findall(r"\b[A-Z]{2,5}\b", text)
     return list(set(keywords + tickers))
 
-def compute_score(entry, keywords, trending_coins):
+def extract_keywords_batch(texts):
+    """
+    Keywords for many texts at once: cache hits are served by content hash,
+    the rest go through a single nlp.pipe call (multi-process for large batches).
+    """
+    hashes = [content_hash(text) for text in texts]
+    missing = {}
+    for h, text in zip(hashes, texts):
+        if h in _keyword_cache:
+            _keyword_cache.move_to_end(h)
+        else:
+            missing.setdefault(h, text)
+
+    if missing:
+        n_process = NER_PROCESSES if len(missing) >= NER_MULTIPROCESS_MIN else 1
+        docs = get_model("spacy_ner").pipe(missing.values(), batch_size=NER_BATCH_SIZE, n_process=n_process)
+        for (h, text), doc in zip(missing.items(), docs):
+            _keyword_cache[h] = _keywords_from_doc(doc, text)
+        while len(_keyword_cache) > NER_CACHE_SIZE:
+            _keyword_cache.popitem(last=False)
+
+    results = []
+    for h, text in zip(hashes, texts):
+        if h not in _keyword_cache:  # evicted within an oversized batch
+            _keyword_cache[h] = _keywords_from_doc(get_model("spacy_ner")(text), text)
+        results.append(list(_keyword_cache[h]))
+    return results
+
+def extract_keywords(text):
+    return extract_keywords_batch([text])[0]
+
+def compute_score(entry, keywords, trending_coins, clean_text=None):
     score = 0
 
     # Keyword based scoring
@@ -48,7 +131,9 @@ def compute_score(entry, keywords, trending_coins):
 
     # Boost for trending coins mention
     title = entry.get("title", "").lower()
-    clean_text = clean_html(entry.get("summary", "") or title).lower()
+    if clean_text is None:
+        clean_text = clean_html(entry.get("summary", "") or entry.get("title", ""))
+    clean_text = clean_text.lower()
     for coin in trending_coins:
         if coin in title or coin in clean_text:
             score += 25
@@ -62,10 +147,30 @@ def compute_score(entry, keywords, trending_coins):
 
     return min(score, 100)
 
-def process_feed(url, trending_coins):
-    feed = feedparser.parse(url)
+def load_feed_state(path=FEED_STATE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+def save_feed_state(state, path=FEED_STATE_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def collect_entries(feed, url, seen=None):
+    """
+    Clean a parsed feed's new entries (skipping ids in `seen`). Returns
+    (entry, article) pairs whose keywords and score are filled in later by
+    score_entries, so NER can run over every feed in one batch.
+    """
     source_name = re.sub(r'https?://(www\.)?', '', url).split('/')[0]
-    articles = []
+    pending = []
+    seen = seen if seen is not None else set()
 
     for entry in feed.entries:
         title = entry.get("title", "")
@@ -77,45 +182,147 @@ def process_feed(url, trending_coins):
         if not published_parsed:
             continue
 
+        article_id = hashlib.md5(link.encode()).hexdigest()
+        if article_id in seen:
+            continue
+
         # Clean
         clean_summary = clean_html(summary or title)
-        keywords = extract_keywords(clean_summary)
-        score = compute_score(entry, keywords, trending_coins)
 
         article = {
-            "id": hashlib.md5(link.encode()).hexdigest(),
+            "id": article_id,
             "source": source_name,
             "title": title,
             "url": link,
             "summary": clean_summary[:300],
             "publish_date": datetime(*published_parsed[:6]).isoformat(),
-            "keywords": keywords,
-            "score": score,
+            "keywords": [],
+            "score": 0,
             "clean_text": clean_summary
         }
 
+        pending.append((entry, article))
+
+    return pending
+
+def score_entries(pending, trending_coins):
+    """Batched keyword extraction and scoring for collected entries."""
+    keywords_list = extract_keywords_batch([article["clean_text"] for _, article in pending])
+    articles = []
+    for (entry, article), keywords in zip(pending, keywords_list):
+        article["keywords"] = keywords
+        article["score"] = compute_score(entry, keywords, trending_coins, article["clean_text"])
         articles.append(article)
-    
     return articles
 
-def ingest_all_feeds():
-    all_articles = []
+def process_feed(feed, url, trending_coins, seen=None):
+    """Turn a parsed feed into article dicts, skipping entries already in `seen`."""
+    return score_entries(collect_entries(feed, url, seen), trending_coins)
+
+async def fetch_feed(client, url, feed_state, host_limits):
+    """
+    Conditional GET for one feed. Returns (parsed feed, new validators), or
+    (None, None) when the server answers 304 Not Modified.
+    """
+    host = httpx.URL(url).host
+    headers = {}
+    if feed_state.get("etag"):
+        headers["If-None-Match"] = feed_state["etag"]
+    if feed_state.get("last_modified"):
+        headers["If-Modified-Since"] = feed_state["last_modified"]
+
+    async with host_limits.setdefault(host, asyncio.Semaphore(PER_HOST_CONCURRENCY)):
+        response = await client.get(url, headers=headers)
+
+    if response.status_code == 304:
+        return None, None
+    response.raise_for_status()
+
+    validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    return await asyncio.to_thread(feedparser.parse, response.content), validators
+
+async def ingest_all_feeds_async(feed_urls=FEED_URLS, state=None):
+    """
+    Fetch, clean and score every feed. Returns (articles, state): with a
+    previous state only new entries come back (unchanged feeds answer 304).
+    The updated state (validators and seen ids) is not written here; the
+    caller saves it with save_feed_state once the articles are stored, so
+    a failed write means the entries are fetched again next run.
+    """
+    state = {} if state is None else state
+    host_limits = {}
+
+    # Load the NER model while feeds download instead of after
+    warm_ner = asyncio.create_task(asyncio.to_thread(warm_up, "spacy_ner"))
 
-    trending_coins = get_trending_coins()  # <-- fetch once here
+    trending_coins = await asyncio.to_thread(get_trending_coins)  # <-- fetch once here
     print(f"Trending coins: {trending_coins}")
 
-    for url in FEED_URLS:
+    collected = {}  # url -> (pending entries, validators)
+
+    async def ingest_one(client, url):
+        feed_state = state.setdefault(url, {})
         try:
-            articles = process_feed(url, trending_coins)
-            all_articles.extend(articles)
+            feed, validators = await fetch_feed(client, url, feed_state, host_limits)
+            if feed is None:
+                print(f"Unchanged (304): {url}")
+                return
+            seen = set(feed_state.get("seen", []))
+            collected[url] = (collect_entries(feed, url, seen), validators)
         except Exception as e:
             print(f"Error processing {url}: {e}")
-    return all_articles
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+    async with httpx.AsyncClient(timeout=FETCH_TIMEOUT, limits=limits, follow_redirects=True,
+                                 headers={"User-Agent": USER_AGENT}) as client:
+        await asyncio.gather(*(ingest_one(client, url) for url in feed_urls))
+    await warm_ner
+
+    # One NER batch across every feed
+    pending = [item for entries, _ in collected.values() for item in entries]
+    all_articles = await asyncio.to_thread(score_entries, pending, trending_coins)
+
+    # Validators and seen ids for the caller to commit after its write
+    for url, (entries, validators) in collected.items():
+        feed_state = state[url]
+        feed_state.update(validators)
+        feed_state["seen"] = (feed_state.get("seen", []) + [a["id"] for _, a in entries])[-MAX_SEEN_PER_FEED:]
+
+    return all_articles, state
+
+def ingest_all_feeds():
+    """Every article currently in the feeds (no conditional GET, nothing skipped)."""
+    articles, _ = asyncio.run(ingest_all_feeds_async())
+    return articles
+
+def ingest_new_articles(state_path=FEED_STATE_FILE):
+    """
+    (articles, state): only entries not seen in earlier runs. Save state
+    with save_feed_state after the articles are stored.
+    """
+    return asyncio.run(ingest_all_feeds_async(state=load_feed_state(state_path)))
+
+def merge_output(articles, path=OUTPUT_FILE):
+    """Add new articles to the JSON output (by id, newest run first) and return the total."""
+    existing = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            try:
+                existing = json.load(f)
+            except json.JSONDecodeError:
+                existing = []
+    new_ids = {a["id"] for a in articles}
+    merged = articles + [a for a in existing if a.get("id") not in new_ids]
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(merged, f, indent=2)
+    os.replace(tmp, path)
+    return len(merged)
 
 if __name__ == "__main__":
-    articles = ingest_all_feeds()
-    
-    with open("cleaned_rss_output.json", "w") as f:
-        json.dump(articles, f, indent=2)
+    articles, feed_state = ingest_new_articles()
+    total = merge_output(articles)
 
-    print(f"Ingested and cleaned {len(articles)} articles.")
+    # Only mark entries as seen once they are stored
+    save_feed_state(feed_state)
+    print(f"Ingested and cleaned {len(articles)} new articles ({total} in {OUTPUT_FILE}).")
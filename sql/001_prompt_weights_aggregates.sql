@@ -0,0 +1,19 @@
+-- 001_prompt_weights_aggregates.sql
+-- Running per-source aggregates for loop_closer's incremental analysis.
+-- analyze_performance only pulls content_performance rows inserted after
+-- the stored watermark (last_performance_id, sql/004) and folds them into these columns.
+
+alter table prompt_weights
+    add column if not exists sample_count     bigint           not null default 0,
+    add column if not exists clicks_sum       double precision not null default 0,
+    add column if not exists conversions_sum  double precision not null default 0,
+    add column if not exists revenue_sum      double precision not null default 0,
+    add column if not exists ctr_sum          double precision not null default 0,
+    add column if not exists ctr_ewma         double precision,
+    add column if not exists last_recorded_at timestamptz;
+
+-- upsert(on_conflict="source") needs a unique key on source
+create unique index if not exists prompt_weights_source_key on prompt_weights (source);
+
+-- Watermark scans
+create index if not exists content_performance_recorded_at_idx on content_performance (recorded_at);
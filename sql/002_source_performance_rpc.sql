@@ -0,0 +1,61 @@
+-- 002_source_performance_rpc.sql
+-- Per-source aggregation of content_performance for loop_closer
+-- (LOOP_CLOSER_MODE=rpc). Returns one row per source for the rows recorded
+-- after p_since, in the same shape loop_closer.batch_aggregates builds
+-- locally, so the client folds it into prompt_weights without pulling raw
+-- rows. The EWMA is split into ctr_contrib = sum(alpha * (1-alpha)^age * ctr)
+-- (age 0 = newest row) and decay = (1-alpha)^n so it can be chained onto
+-- the stored value.
+--
+-- Call: supabase.rpc("source_performance_v1", {"p_since": ..., "p_alpha": 0.1})
+-- Contract changes get a new version (source_performance_v2, ...).
+
+create or replace function source_performance_v1(
+    p_since timestamptz default null,
+    p_alpha double precision default 0.1
+)
+returns table (
+    source           text,
+    sample_count     bigint,
+    clicks_sum       double precision,
+    conversions_sum  double precision,
+    revenue_sum      double precision,
+    ctr_sum          double precision,
+    first_ctr        double precision,
+    ctr_contrib      double precision,
+    decay            double precision,
+    last_recorded_at timestamptz
+)
+language sql
+stable
+as $$
+    with scored as (
+        select
+            cp.source,
+            coalesce(cp.clicks, 0)::double precision      as clicks,
+            coalesce(cp.conversions, 0)::double precision as conversions,
+            coalesce(cp.revenue, 0)::double precision     as revenue,
+            cp.recorded_at,
+            case when cp.clicks > 0 then cp.conversions::double precision / cp.clicks else 0 end as ctr,
+            row_number() over (partition by cp.source order by cp.recorded_at desc) - 1 as age,
+            row_number() over (partition by cp.source order by cp.recorded_at) as pos
+        from content_performance cp
+        where (p_since is null or cp.recorded_at > p_since)
+          and coalesce(cp.source, '') <> ''
+    )
+    select
+        s.source,
+        count(*),
+        sum(s.clicks),
+        sum(s.conversions),
+        sum(s.revenue),
+        sum(s.ctr),
+        max(case when s.pos = 1 then s.ctr end),
+        sum(p_alpha * power(1 - p_alpha, s.age) * s.ctr),
+        power(1 - p_alpha, count(*)),
+        max(s.recorded_at)
+    from scored s
+    group by s.source;
+$$;
+
+grant execute on function source_performance_v1(timestamptz, double precision) to service_role;
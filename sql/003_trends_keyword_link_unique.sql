@@ -0,0 +1,25 @@
+-- 003_trends_keyword_link_unique.sql
+-- "Supabase save_trends.py" upserts with on_conflict=keyword,link, which
+-- PostgREST can only do against a unique constraint on exactly those
+-- columns. Remove existing duplicates first (keeping the latest fetch per
+-- pair), then add the constraint.
+
+begin;
+
+delete from trends t
+using (
+    select ctid,
+           row_number() over (
+               partition by keyword, link
+               order by fetched_at desc nulls last, ctid desc
+           ) as rn
+    from trends
+    where keyword is not null and link is not null
+) d
+where t.ctid = d.ctid
+  and d.rn > 1;
+
+alter table trends
+    add constraint trends_keyword_link_key unique (keyword, link);
+
+commit;
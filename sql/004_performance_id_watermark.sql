@@ -0,0 +1,79 @@
+-- 004_performance_id_watermark.sql
+-- loop_closer's watermark moves from recorded_at to content_performance.id.
+-- recorded_at is set by the writer, so a row inserted late with an older
+-- timestamp fell behind max(last_recorded_at) and was never counted; id is
+-- assigned by the database at insert time.
+--
+-- Limitation: ids are handed out at insert but become visible at commit,
+-- so a transaction that commits after a higher id has already been folded
+-- is skipped. Writers insert through PostgREST in single short statements,
+-- which narrows this to inserts racing a loop_closer run; a writer with long
+-- transactions would need a re-scan window behind the watermark.
+--
+-- source_performance_v2 replaces source_performance_v1 (sql/002): it takes
+-- the last folded id, orders the EWMA by insertion and also returns the
+-- batch's max id.
+
+alter table prompt_weights
+    add column if not exists last_performance_id bigint;
+
+-- Carry over the old watermark so rows already folded are not counted twice
+update prompt_weights pw
+set last_performance_id = (
+    select max(cp.id) from content_performance cp where cp.recorded_at <= pw.last_recorded_at
+)
+where pw.last_performance_id is null
+  and pw.last_recorded_at is not null;
+
+create or replace function source_performance_v2(
+    p_after_id bigint default null,
+    p_alpha double precision default 0.1
+)
+returns table (
+    source              text,
+    sample_count        bigint,
+    clicks_sum          double precision,
+    conversions_sum     double precision,
+    revenue_sum         double precision,
+    ctr_sum             double precision,
+    first_ctr           double precision,
+    ctr_contrib         double precision,
+    decay               double precision,
+    last_recorded_at    timestamptz,
+    last_performance_id bigint
+)
+language sql
+stable
+as $$
+    with scored as (
+        select
+            cp.id,
+            cp.source,
+            coalesce(cp.clicks, 0)::double precision      as clicks,
+            coalesce(cp.conversions, 0)::double precision as conversions,
+            coalesce(cp.revenue, 0)::double precision     as revenue,
+            cp.recorded_at,
+            case when cp.clicks > 0 then cp.conversions::double precision / cp.clicks else 0 end as ctr,
+            row_number() over (partition by cp.source order by cp.id desc) - 1 as age,
+            row_number() over (partition by cp.source order by cp.id) as pos
+        from content_performance cp
+        where (p_after_id is null or cp.id > p_after_id)
+          and coalesce(cp.source, '') <> ''
+    )
+    select
+        s.source,
+        count(*),
+        sum(s.clicks),
+        sum(s.conversions),
+        sum(s.revenue),
+        sum(s.ctr),
+        max(case when s.pos = 1 then s.ctr end),
+        sum(p_alpha * power(1 - p_alpha, s.age) * s.ctr),
+        power(1 - p_alpha, count(*)),
+        max(s.recorded_at),
+        max(s.id)
+    from scored s
+    group by s.source;
+$$;
+
+grant execute on function source_performance_v2(bigint, double precision) to service_role;
@@ -0,0 +1,26 @@
+-- 005_tweets_unique.sql
+-- twitter_helper.save_tweets_to_supabase upserts with on_conflict=tweet_id,
+-- which PostgREST can only do against a unique constraint on tweet_id;
+-- without it every chunk fails and the since_id marks never advance.
+-- Remove the duplicates left by the old plain inserts first (keeping the
+-- most recently written row per tweet), then add the constraint.
+
+begin;
+
+delete from tweets t
+using (
+    select ctid,
+           row_number() over (
+               partition by tweet_id
+               order by ctid desc
+           ) as rn
+    from tweets
+    where tweet_id is not null
+) d
+where t.ctid = d.ctid
+  and d.rn > 1;
+
+alter table tweets
+    add constraint tweets_tweet_id_key unique (tweet_id);
+
+commit;
@@ -0,0 +1,181 @@
+# supabase_bulk.py
+"""
+Bulk writer for Supabase tables over PostgREST.
+
+Rows keep their native JSON types (numbers stay numbers, timestamps become
+ISO strings, NaN becomes null), are split into chunks bounded by row count
+and encoded size, and are sent in parallel over one pooled client
+(gzip is opt-in). Writes are idempotent upserts when a conflict key is given.
+Each chunk is retried on its own, so one bad chunk never drops the rest.
+"""
+
+import os
+import gzip
+import json
+import math
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from retry_helper import retry_sync, log_retry, is_retryable
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+CHUNK_MAX_ROWS = int(os.getenv("SUPABASE_CHUNK_ROWS", 1000))
+CHUNK_MAX_BYTES = int(os.getenv("SUPABASE_CHUNK_BYTES", 1024 * 1024))
+MAX_WORKERS = int(os.getenv("SUPABASE_BULK_WORKERS", 4))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 30))
+# PostgREST and the Supabase gateway do not inflate request bodies: only
+# enable against an endpoint verified to accept Content-Encoding: gzip
+USE_GZIP = os.getenv("SUPABASE_GZIP", "0") == "1"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    # numpy / pandas scalars
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def _clean(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+def encode_rows(rows):
+    """DataFrame or list of dicts -> list of JSON-encoded rows (bytes)."""
+    if hasattr(rows, "to_json"):
+        # Vectorized: native numbers, ISO dates, NaN -> null
+        return [line.encode() for line in rows.to_json(orient="records", lines=True, date_format="iso").splitlines() if line]
+    return [json.dumps({k: _clean(v) for k, v in row.items()}, default=_json_default,
+                       separators=(",", ":")).encode() for row in rows]
+
+def is_row_error(exc):
+    """
+    True when PostgREST rejected a chunk because of the data in some row
+    (409 conflict, SQLSTATE 22xxx data / 23xxx integrity errors), as opposed
+    to chunk-wide errors (missing constraint, unknown column, auth).
+    """
+    response = getattr(exc, "response", None)
+    if response is None:
+        return False
+    if response.status_code == 409:
+        return True
+    try:
+        code = str(response.json().get("code") or "")
+    except ValueError:
+        return False
+    return code[:2] in ("22", "23")
+
+def chunk_rows(encoded, max_rows=CHUNK_MAX_ROWS, max_bytes=CHUNK_MAX_BYTES):
+    """Split encoded rows into chunks bounded by row count and payload size."""
+    chunk, size = [], 2
+    for row in encoded:
+        if chunk and (len(chunk) >= max_rows or size + len(row) + 1 > max_bytes):
+            yield chunk
+            chunk, size = [], 2
+        chunk.append(row)
+        size += len(row) + 1
+    if chunk:
+        yield chunk
+
+
+class SupabaseBulkWriter:
+    """Pooled PostgREST client for chunked, parallel bulk writes."""
+
+    def __init__(self, url=None, key=None, max_workers=MAX_WORKERS,
+                 chunk_max_rows=CHUNK_MAX_ROWS, chunk_max_bytes=CHUNK_MAX_BYTES):
+        self.url = (url or os.getenv("SUPABASE_URL") or "").rstrip("/")
+        key = key or os.getenv("SUPABASE_KEY")
+        if not self.url or not key:
+            raise ValueError("❌ SUPABASE_URL or SUPABASE_KEY not set.")
+        self.max_workers = max_workers
+        self.chunk_max_rows = chunk_max_rows
+        self.chunk_max_bytes = chunk_max_bytes
+        self.client = httpx.Client(
+            http2=HTTP2,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_workers, max_keepalive_connections=max_workers),
+            headers={"apikey": key, "Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+        )
+
+    def _post_chunk(self, table, chunk, on_conflict, ignore_duplicates):
+        body = b"[" + b",".join(chunk) + b"]"
+        headers = {
+            "Prefer": ("resolution=ignore-duplicates" if ignore_duplicates else "resolution=merge-duplicates")
+                      + ",return=minimal",
+        }
+        if USE_GZIP:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        response = self.client.post(f"{self.url}/rest/v1/{table}", content=body, headers=headers, params=params)
+        response.raise_for_status()
+        return len(chunk)
+
+    def upsert(self, table, rows, on_conflict=None, ignore_duplicates=False, isolate_failures=False):
+        """
+        Write rows (DataFrame or list of dicts) to table. on_conflict is the
+        comma-separated conflict key for idempotent upserts.
+
+        With isolate_failures, a chunk rejected because of its rows (e.g. one
+        row violating a constraint) is bisected until the offending rows are
+        found, so every other row is still written. Chunk-wide errors fail
+        the chunk without bisecting.
+
+        Returns {"written": int, "failed": [row dicts], "errors": [str],
+        "row_errors": [{"row": dict, "error": str}]}.
+        """
+        chunks = list(chunk_rows(encode_rows(rows), self.chunk_max_rows, self.chunk_max_bytes))
+        result = {"written": 0, "failed": [], "errors": [], "row_errors": []}
+        if not chunks:
+            return result
+
+        def post(chunk):
+            return retry_sync(self._post_chunk, (table, chunk, on_conflict, ignore_duplicates),
+                              max_attempts=3, base_delay=1, deadline=REQUEST_TIMEOUT * 3,
+                              on_retry=log_retry, name=f"upsert[{table}]")
+
+        def send(chunk):
+            """Returns (written, [(encoded row, error)])."""
+            try:
+                return post(chunk), []
+            except Exception as e:
+                if isolate_failures and len(chunk) > 1 and not is_retryable(e) and is_row_error(e):
+                    middle = len(chunk) // 2
+                    left, right = send(chunk[:middle]), send(chunk[middle:])
+                    return left[0] + right[0], left[1] + right[1]
+                return 0, [(row, e) for row in chunk]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            for written, failures in pool.map(send, chunks):
+                result["written"] += written
+                for row, error in failures:
+                    decoded = json.loads(row)
+                    result["failed"].append(decoded)
+                    result["row_errors"].append({"row": decoded, "error": str(error)})
+                    if str(error) not in result["errors"]:
+                        result["errors"].append(str(error))
+        return result
+
+    def close(self):
+        self.client.close()
+
+
+_default_writer = None
+
+def get_writer():
+    """Shared writer configured from SUPABASE_URL / SUPABASE_KEY."""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = SupabaseBulkWriter()
+    return _default_writer
+
+def bulk_upsert(table, rows, on_conflict=None, ignore_duplicates=False):
+    return get_writer().upsert(table, rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
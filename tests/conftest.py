@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Modules live at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never touch the shared Redis from tests
+os.environ.pop("UPSTASH_URL", None)
@@ -0,0 +1,50 @@
+import asyncio
+import glob
+import json
+
+import blood_delivery
+from blood_delivery import BloodSink
+
+
+def make_sink(tmp_path, monkeypatch, sent):
+    monkeypatch.setattr(blood_delivery, "SPOOL_DIR", str(tmp_path))
+    sink = BloodSink("https://blood.example/ingest", max_records=2)
+
+    async def post(body, headers):
+        await asyncio.sleep(0.01)
+        sent.extend(record["n"] for record in json.loads(body)["data"])
+
+    sink._post = post
+    return sink
+
+
+def spool(sink, count):
+    for n in range(count):
+        sink._spill([json.dumps({"n": n}).encode()])
+
+
+def test_overlapping_flushes_replay_once(tmp_path, monkeypatch):
+    sent = []
+    sink = make_sink(tmp_path, monkeypatch, sent)
+    spool(sink, 6)
+
+    async def run():
+        await asyncio.gather(sink.flush(), sink.flush())
+
+    asyncio.run(run())
+    assert sorted(sent) == list(range(6))
+    assert not glob.glob(str(tmp_path / "*.replay"))
+
+
+def test_replay_is_capped_per_flush(tmp_path, monkeypatch):
+    sent = []
+    sink = make_sink(tmp_path, monkeypatch, sent)
+    spool(sink, 10)
+
+    asyncio.run(sink._replay_spool(max_batches=2))
+    assert sorted(sent) == [0, 1, 2, 3]
+    assert len(glob.glob(str(tmp_path / "*.replay"))) == 1
+
+    asyncio.run(sink._replay_spool(max_batches=10))
+    assert sorted(sent) == list(range(10))
+    assert not glob.glob(str(tmp_path / "*.replay"))
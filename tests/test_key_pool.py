@@ -0,0 +1,43 @@
+import multiprocessing
+
+from key_pool import LocalKeyStore, KeyPool, key_id, quota_day
+
+
+def _reserve(path, count, out):
+    store = LocalKeyStore(path)
+    out.extend([store.reserve_slot("k", 1000.0, 1.0) for _ in range(count)])
+    for _ in range(count):
+        store.incr("k", "2026-01-01")
+
+
+def test_local_store_shared_across_processes(tmp_path):
+    path = str(tmp_path / "state.json")
+    with multiprocessing.Manager() as manager:
+        starts = manager.list()
+        workers = [multiprocessing.Process(target=_reserve, args=(path, 20, starts)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            assert worker.exitcode == 0
+        starts = sorted(starts)
+    # Every request got its own slot, one interval apart, and every use was counted
+    assert starts == [1000.0 + i for i in range(80)]
+    assert LocalKeyStore(path).used("k", "2026-01-01") == 80
+
+
+def test_store_sees_other_instances_updates(tmp_path):
+    path = str(tmp_path / "state.json")
+    first, second = LocalKeyStore(path), LocalKeyStore(path)
+    first.set_cooldown("k", 123.0)
+    second.incr("k", "2026-01-01")
+    assert first.used("k", "2026-01-01") == 1
+    assert second.cooldown_until("k") == 123.0
+
+
+def test_pool_skips_cooling_key(tmp_path):
+    store = LocalKeyStore(str(tmp_path / "state.json"))
+    pool = KeyPool(["a", "b"], qps=1000, store=store)
+    pool.report("a", 429)
+    assert pool.acquire() == "b"
+    assert store.used(key_id("b"), quota_day()) == 1
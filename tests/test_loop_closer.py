@@ -0,0 +1,105 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import loop_closer
+from performance_rpc import SQLiteSourcePerformance, BATCH_COLUMNS
+
+ALPHA = loop_closer.EWMA_ALPHA
+
+# id, asin, source, clicks, conversions, revenue, recorded_at
+ROWS = [
+    (1, "A1", "Twitter", 100, 5, 40.0, "2026-01-01T10:00:00"),
+    (2, "A2", "Google", 50, 10, 25.5, "2026-01-01T11:00:00"),
+    (3, "A3", "Twitter", 0, 0, 0.0, "2026-01-01T12:00:00"),
+    (4, "A4", "Reddit", 80, 8, 12.0, "2026-01-02T09:00:00"),
+    (5, "A5", "Twitter", 40, 12, 60.0, "2026-01-02T10:00:00"),
+    (6, "A6", "Google", 30, 3, 9.0, "2025-12-30T08:00:00"),  # late row, older timestamp
+    (7, "A7", "Twitter", 20, 1, 4.0, "2026-01-03T10:00:00"),
+    (8, "A8", "Reddit", 10, 0, 0.0, "2026-01-03T11:00:00"),
+]
+
+
+def performance_frame(rows=ROWS):
+    return pd.DataFrame(rows, columns=loop_closer.PERFORMANCE_COLUMNS.split(","))
+
+
+def empty_aggregates():
+    return pd.DataFrame(columns=["source"] + loop_closer.AGGREGATE_COLUMNS).set_index("source")
+
+
+@pytest.fixture
+def sqlite_rpc():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("create table content_performance "
+                 "(id integer primary key, asin text, source text, clicks integer, "
+                 "conversions integer, revenue real, recorded_at text)")
+    conn.executemany("insert into content_performance values (?, ?, ?, ?, ?, ?, ?)", ROWS)
+    return SQLiteSourcePerformance(conn)
+
+
+def assert_same_batch(local, remote):
+    columns = [col for col in BATCH_COLUMNS if col != "source"]
+    local, remote = local[columns].sort_index(), remote[columns].sort_index()
+    pd.testing.assert_index_equal(local.index, remote.index)
+    for col in columns:
+        if col == "last_recorded_at":
+            assert list(local[col]) == list(remote[col])
+        else:
+            np.testing.assert_allclose(local[col].to_numpy(dtype=float), remote[col].to_numpy(dtype=float))
+
+
+@pytest.mark.parametrize("after_id", [None, 0, 3, 6])
+def test_batch_aggregates_matches_sqlite(sqlite_rpc, after_id):
+    performance = performance_frame([row for row in ROWS if after_id is None or row[0] > after_id])
+    assert_same_batch(loop_closer.batch_aggregates(performance, ALPHA), sqlite_rpc(after_id, ALPHA))
+
+
+def test_sqlite_empty_batch(sqlite_rpc):
+    batch = sqlite_rpc(len(ROWS), ALPHA)
+    assert batch.empty
+    assert list(batch.columns) == BATCH_COLUMNS[1:]
+
+
+def expected_ewma(performance):
+    """pandas' recursive EWMA per source, seeded with the first CTR."""
+    performance = performance.sort_values("id")
+    ctr = (performance["conversions"] / performance["clicks"]).where(performance["clicks"] > 0, 0.0)
+    return ctr.groupby(performance["source"]).apply(lambda s: s.ewm(alpha=ALPHA, adjust=False).mean().iloc[-1])
+
+
+@pytest.mark.parametrize("split", [1, 3, 5, 7])
+def test_folded_batches_match_pandas_ewm(sqlite_rpc, split):
+    performance = performance_frame()
+    first = loop_closer.batch_aggregates(performance[performance["id"] <= split], ALPHA)
+    merged = loop_closer.merge_aggregates(empty_aggregates(), first)
+    merged = loop_closer.merge_aggregates(merged, sqlite_rpc(split, ALPHA))
+
+    expected = expected_ewma(performance)
+    np.testing.assert_allclose(merged.loc[expected.index, "ctr_ewma"].to_numpy(dtype=float), expected.to_numpy())
+    assert merged["sample_count"].to_dict() == performance.groupby("source").size().to_dict()
+    assert merged["last_performance_id"].to_dict() == performance.groupby("source")["id"].max().to_dict()
+
+
+
+def test_late_row_keeps_newest_recorded_at():
+    performance = performance_frame()
+    merged = loop_closer.merge_aggregates(empty_aggregates(),
+                                          loop_closer.batch_aggregates(performance[performance["id"] <= 5]))
+    merged = loop_closer.merge_aggregates(merged, loop_closer.batch_aggregates(performance[performance["id"] == 6]))
+    assert merged.loc["Google", "last_recorded_at"] == "2026-01-01T11:00:00"
+    assert merged.loc["Google", "last_performance_id"] == 6
+    assert merged.loc["Google", "sample_count"] == 2
+
+
+def test_weight_records_only_touch_sources_in_batch():
+    performance = performance_frame()
+    stored = loop_closer.merge_aggregates(empty_aggregates(), loop_closer.batch_aggregates(performance))
+    stored.loc["LinkedIn"] = stored.loc["Reddit"]  # in prompt_weights, no rows this run
+    batch = loop_closer.batch_aggregates(performance_frame([(9, "A9", "Twitter", 10, 2, 1.0, "2026-01-04T10:00:00")]))
+    records, weights = loop_closer.weight_records(loop_closer.merge_aggregates(stored, batch), batch)
+    assert [record["source"] for record in records] == ["Twitter"]
+    assert list(weights) == ["Twitter"]
+    assert isinstance(records[0]["sample_count"], int)
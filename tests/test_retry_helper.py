@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from retry_helper import is_retryable, get_status, get_retry_after, retry_sync
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+@pytest.mark.parametrize("status", [408, 425, 429, 500, 502, 503, 504])
+def test_retryable_statuses(status):
+    assert is_retryable(HTTPError(status))
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 409, 422])
+def test_client_errors_fail_fast(status):
+    assert not is_retryable(HTTPError(status))
+
+
+@pytest.mark.parametrize("exc", [TimeoutError(), ConnectionError(), asyncio.TimeoutError(), RuntimeError()])
+def test_transport_and_unknown_errors_retry(exc):
+    assert is_retryable(exc)
+
+
+@pytest.mark.parametrize("exc", [TypeError(), ValueError(), KeyError("x"), AttributeError()])
+def test_programming_errors_fail_fast(exc):
+    assert not is_retryable(exc)
+
+
+def test_status_from_attribute_or_response():
+    exc = Exception()
+    exc.status_code = 503
+    assert get_status(exc) == 503
+    assert get_status(HTTPError(429)) == 429
+    assert get_status(ValueError()) is None
+
+
+def test_retry_after_header():
+    assert get_retry_after(HTTPError(429, {"Retry-After": "7"})) == 7.0
+    assert get_retry_after(HTTPError(429, {"Retry-After": "soon"})) is None
+    assert get_retry_after(HTTPError(429)) is None
+
+
+def test_retry_sync_stops_on_client_error():
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise HTTPError(404)
+
+    with pytest.raises(HTTPError):
+        retry_sync(call, max_attempts=3, base_delay=0)
+    assert len(calls) == 1
+
+
+def test_retry_sync_retries_until_success():
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise HTTPError(503)
+        return "ok"
+
+    assert retry_sync(call, max_attempts=3, base_delay=0) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_sync_gives_up_when_retry_after_exceeds_deadline():
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise HTTPError(429, {"Retry-After": "60"})
+
+    with pytest.raises(HTTPError):
+        retry_sync(call, max_attempts=5, base_delay=0, deadline=1)
+    assert len(calls) == 1
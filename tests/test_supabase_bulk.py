@@ -0,0 +1,82 @@
+import json
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from supabase_bulk import encode_rows, chunk_rows, is_row_error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_chunk_rows_by_count():
+    rows = [b'{"a":1}'] * 7
+    assert [len(chunk) for chunk in chunk_rows(rows, max_rows=3)] == [3, 3, 1]
+
+
+def test_chunk_rows_by_bytes():
+    rows = [b"x" * 10] * 5
+    chunks = list(chunk_rows(rows, max_rows=100, max_bytes=35))
+    # "[" + "]" plus one separator per row
+    assert all(2 + sum(len(r) + 1 for r in chunk) <= 35 for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == 5
+
+
+def test_chunk_rows_oversized_row_gets_own_chunk():
+    rows = [b"x" * 5, b"y" * 100, b"z" * 5]
+    assert list(chunk_rows(rows, max_bytes=20)) == [[b"x" * 5], [b"y" * 100], [b"z" * 5]]
+
+
+def test_encode_rows_nan_to_null():
+    assert [json.loads(r) for r in encode_rows([{"a": float("nan"), "b": 1}])] == [{"a": None, "b": 1}]
+
+
+class PostgrestError(Exception):
+    def __init__(self, status, body):
+        super().__init__(status)
+        self.response = SimpleNamespace(status_code=status, json=lambda: body)
+
+
+@pytest.mark.parametrize("status,body,expected", [
+    (409, {"code": "23505"}, True),
+    (400, {"code": "23502"}, True),
+    (400, {"code": "22P02"}, True),
+    (400, {"code": "42P10"}, False),  # no unique constraint for on_conflict
+    (400, {"code": "PGRST204"}, False),  # unknown column
+    (401, {}, False),
+])
+def test_is_row_error(status, body, expected):
+    assert is_row_error(PostgrestError(status, body)) is expected
+
+
+def test_is_row_error_without_response():
+    assert not is_row_error(ValueError())
+
+
+@pytest.fixture(scope="module")
+def save_trends():
+    # The script's filename has a space, so it cannot be imported by name
+    spec = importlib.util.spec_from_file_location("save_trends", os.path.join(ROOT, "Supabase save_trends.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_dedup_rows_keeps_last_per_keyword_link(save_trends):
+    rows = [
+        {"keyword": "ai", "link": "https://a", "title": "old"},
+        {"keyword": "ai", "link": "https://b", "title": "b"},
+        {"keyword": "ml", "link": "https://a", "title": "other keyword"},
+        {"keyword": "ai", "link": "https://a", "title": "new"},
+    ]
+    assert save_trends.dedup_rows(rows) == [
+        {"keyword": "ai", "link": "https://a", "title": "new"},
+        {"keyword": "ai", "link": "https://b", "title": "b"},
+        {"keyword": "ml", "link": "https://a", "title": "other keyword"},
+    ]
+
+
+def test_build_rows(save_trends):
+    rows = save_trends.build_rows([{"title": "T", "link": "L"}], "ai", fetched_at="2026-01-01")
+    assert rows == [{"title": "T", "link": "L", "keyword": "ai", "interest": None, "fetched_at": "2026-01-01"}]
@@ -0,0 +1,71 @@
+import pytest
+
+import twitter_helper
+from twitter_helper import (plan_queries, build_query, match_keywords, plan_groups,
+                            group_window, advance_mark, is_stale)
+
+
+def test_plan_queries_packs_within_limit():
+    keywords = [f"keyword{i}" for i in range(40)]
+    groups = plan_queries(keywords, max_length=120)
+    assert [kw for group in groups for kw in group] == keywords
+    assert all(len(build_query(group)) <= 120 for group in groups)
+    assert len(groups) > 1
+
+
+def test_plan_queries_dedups_and_skips_blanks():
+    assert plan_queries(["AI", " ", "AI", "crypto"]) == [["AI", "crypto"]]
+
+
+def test_build_query_quotes_phrases():
+    assert build_query(["AI", 'machine "learning"']) == \
+        '(AI OR "machine learning") ' + twitter_helper.QUERY_FILTERS
+
+
+def test_match_keywords_whole_words():
+    assert match_keywords("New AI model released", ["AI", "crypto"]) == ["AI"]
+    assert match_keywords("Bitcoin and ETH rally", ["bitcoin", "eth", "AI"]) == ["bitcoin", "eth"]
+
+
+def test_match_keywords_falls_back_to_substring():
+    # The API also matches inside hashtags and URLs
+    assert match_keywords("#OpenAI ships", ["AI", "crypto"]) == ["AI"]
+    assert match_keywords("nothing here", ["AI"]) == []
+
+
+def test_plan_groups_separates_mark_kinds():
+    marks = {"new": {}, "marked": {"since_id": 10}, "gap": {"since_id": 5, "until_id": 20, "newest_id": 30}}
+    assert plan_groups(marks) == [["new"], ["marked"], ["gap"]]
+
+
+def test_group_window_covers_every_keyword():
+    marks = {"a": {"since_id": 10}, "b": {"since_id": 7}}
+    assert group_window(["a", "b"], marks) == {"since_id": 7}
+    marks["c"] = {}
+    assert group_window(["a", "c"], marks) == {}
+
+
+@pytest.mark.parametrize("mark,newest,oldest,complete,expected", [
+    ({}, 50, 40, True, {"since_id": 50}),
+    ({}, 50, 40, False, {"since_id": 50}),
+    ({"since_id": 10}, 50, 40, True, {"since_id": 50}),
+    ({"since_id": 10}, None, None, True, {"since_id": 10}),
+    ({"since_id": 10}, 50, 40, False, {"since_id": 10, "until_id": 40, "newest_id": 50}),
+    ({"since_id": 10}, 50, 5, False, {"since_id": 50}),
+    ({"since_id": 10, "until_id": 40, "newest_id": 50}, 35, 20, False,
+     {"since_id": 10, "until_id": 20, "newest_id": 50}),
+    ({"since_id": 10, "until_id": 40, "newest_id": 50}, 35, 20, True, {"since_id": 50}),
+])
+def test_advance_mark(mark, newest, oldest, complete, expected):
+    assert advance_mark(mark, newest, oldest, complete) == expected
+
+
+def snowflake(seconds):
+    return (int(seconds * 1000) - twitter_helper.TWITTER_EPOCH_MS) << 22
+
+
+def test_is_stale():
+    now = 1_800_000_000
+    assert not is_stale({}, now)
+    assert not is_stale({"since_id": snowflake(now - 3600)}, now)
+    assert is_stale({"since_id": snowflake(now - 8 * 24 * 3600)}, now)
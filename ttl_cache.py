@@ -0,0 +1,181 @@
+# ttl_cache.py
+"""
+TTL cache with stale-while-revalidate for slow or rate-limited APIs.
+
+Values live in an in-process dict and, when UPSTASH_URL is set, in Redis
+so every process shares them. A fresh value is returned as is; a stale
+one is returned immediately while a single background thread refreshes
+it. Concurrent misses for the same key wait on one in-flight call, and a
+Redis lock makes sure only one process loads or refreshes a key per TTL
+(cold processes wait for the value it publishes). When a refresh fails
+the last good value keeps being served, and failed loads back off for
+ERROR_BACKOFF seconds.
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+
+from redis_manager import sync_client
+
+REDIS_PREFIX = "ttl_cache:"
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", 60 * 60 * 24))  # keep last good values this long
+ERROR_BACKOFF = int(os.getenv("CACHE_ERROR_BACKOFF", 60))    # seconds before retrying a failed refresh
+COLD_WAIT = float(os.getenv("CACHE_COLD_WAIT", 15))          # seconds to wait for another process's first load
+COLD_POLL = 0.25
+
+
+def _redis_client():
+    """Sync Redis client (callers run in worker threads), or None."""
+    try:
+        return sync_client()
+    except Exception as e:
+        print(f"[Cache] Redis unavailable ({e}); using in-process cache only")
+        return None
+
+
+class TTLCache:
+    """Named cache: get(key, loader, ttl) -> value."""
+
+    def __init__(self, namespace, stale_ttl=STALE_TTL):
+        self.namespace = namespace
+        self.stale_ttl = stale_ttl
+        self._entries = {}    # key -> (value, fetched_at)
+        self._retry_at = {}   # key -> earliest time to retry after a failure
+        self._errors = {}     # key -> last load error
+        self._inflight = {}   # key -> Future
+        self._lock = threading.Lock()
+
+    def _redis_key(self, key):
+        return f"{REDIS_PREFIX}{self.namespace}:{key}"
+
+    def _load_shared(self, key):
+        r = _redis_client()
+        if r is None:
+            return None
+        try:
+            raw = r.get(self._redis_key(key))
+        except Exception as e:
+            print(f"[Cache] Redis get failed: {e}")
+            return None
+        if not raw:
+            return None
+        cached = json.loads(raw)
+        return cached["value"], cached["fetched_at"]
+
+    def _store(self, key, value, fetched_at):
+        self._entries[key] = (value, fetched_at)
+        r = _redis_client()
+        if r is not None:
+            try:
+                payload = json.dumps({"value": value, "fetched_at": fetched_at})
+                r.set(self._redis_key(key), payload, ex=self.stale_ttl)
+            except Exception as e:
+                print(f"[Cache] Redis set failed: {e}")
+
+    def _claim_refresh(self, key, ttl):
+        """Cross-process refresh lock; True when this process should call the loader."""
+        r = _redis_client()
+        if r is None:
+            return True
+        try:
+            return bool(r.set(self._redis_key(key) + ":lock", "1", nx=True, ex=max(1, int(ttl))))
+        except Exception:
+            return True
+
+    def _hold_lock(self, key, seconds):
+        """Keep other processes from calling the loader for a while (after a failure)."""
+        r = _redis_client()
+        if r is not None:
+            try:
+                r.set(self._redis_key(key) + ":lock", "1", ex=max(1, int(seconds)))
+            except Exception:
+                pass
+
+    def _wait_for_shared(self, key):
+        """Poll Redis for the value another process is loading."""
+        deadline = time.time() + COLD_WAIT
+        while time.time() < deadline:
+            shared = self._load_shared(key)
+            if shared is not None:
+                return shared
+            time.sleep(COLD_POLL)
+        return None
+
+    def _load(self, key, loader, ttl, claimed):
+        if not claimed and not self._claim_refresh(key, ttl):
+            # Another process holds the lock: use what it publishes
+            shared = self._wait_for_shared(key)
+            if shared is None:
+                raise TimeoutError(f"[Cache] No value for {self.namespace}:{key} from the process loading it")
+            self._entries[key] = shared
+            return shared[0]
+        try:
+            value = loader()
+        except Exception:
+            self._hold_lock(key, ERROR_BACKOFF)
+            raise
+        self._store(key, value, time.time())
+        return value
+
+    def _refresh(self, key, loader, ttl, future, claimed=True):
+        try:
+            value = self._load(key, loader, ttl, claimed)
+            self._retry_at.pop(key, None)
+            self._errors.pop(key, None)
+            future.set_result(value)
+        except Exception as e:
+            self._retry_at[key] = time.time() + ERROR_BACKOFF
+            self._errors[key] = e
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _start_refresh(self, key, loader, ttl, background):
+        """
+        Return the in-flight Future for key, starting a refresh if there is
+        none. Background refreshes have already claimed the Redis lock; cold
+        loads claim it (or wait for its holder) themselves.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[key] = future
+        if background:
+            threading.Thread(target=self._refresh, args=(key, loader, ttl, future), daemon=True).start()
+        else:
+            self._refresh(key, loader, ttl, future, claimed=False)
+        return future
+
+    def get(self, key, loader, ttl):
+        """
+        Cached value for key; loader() is called at most once per ttl.
+        Raises only when the loader fails and no previous value exists.
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None or now - entry[1] >= ttl:
+            shared = self._load_shared(key)
+            if shared is not None and (entry is None or shared[1] > entry[1]):
+                self._entries[key] = entry = shared
+
+        if entry is not None:
+            value, fetched_at = entry
+            if now - fetched_at < ttl:
+                return value
+            # Stale: serve it and revalidate in the background
+            if now >= self._retry_at.get(key, 0) and self._claim_refresh(key, ttl):
+                self._start_refresh(key, loader, ttl, background=True)
+            return value
+
+        # Cold: back off after a failed load instead of hammering the API
+        if now < self._retry_at.get(key, 0):
+            raise self._errors.get(key) or RuntimeError(f"[Cache] {self.namespace}:{key} is backing off")
+
+        # Everyone (in every process) waits on one call
+        return self._start_refresh(key, loader, ttl, background=False).result()
@@ -1,13 +1,22 @@
 import tweepy
 import time
+import asyncio
 import os
-from supabase import create_client
+import re
+import json
+import threading
+import httpx
+from retry_helper import retryable, retry_async, is_retryable, get_status, log_retry
+from supabase_bulk import bulk_upsert
+from redis_manager import sync_client
 
 # ---------------------------
 # Twitter API setup
 # ---------------------------
 BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")  # Set in environment
-client = tweepy.Client(bearer_token=BEARER_TOKEN, wait_on_rate_limit=True)
+# Rate limits are handled by retryable (honouring x-rate-limit-reset within its
+# deadline) instead of tweepy sleeping for up to 15 minutes
+client = tweepy.Client(bearer_token=BEARER_TOKEN, wait_on_rate_limit=False)
 
 # Keywords to rotate
 KEYWORDS = [
@@ -17,33 +26,165 @@ KEYWORDS = [
     "airdrop",
 ]
 
+# Incremental collection: per-keyword high-water marks. A mark is
+# {"since_id"} once everything up to it was stored, plus {"until_id",
+# "newest_id"} while a cycle's budget ran out before reaching since_id:
+# the next cycle fills (since_id, until_id) first, then moves on from newest_id.
+TWEET_BUDGET = int(os.getenv("TWITTER_CYCLE_BUDGET", 200))  # max tweets per keyword per cycle
+PAGE_SIZE = 100                                             # search/recent allows 10..100
+SINCE_ID_KEY = "twitter:since_id"                           # Redis hash keyword -> mark (JSON)
+SINCE_ID_FILE = os.getenv("TWITTER_STATE_FILE", "twitter_since_ids.json")
+
+_state_lock = threading.Lock()
+
+# Batched queries: several keywords OR-joined into one request
+SEARCH_URL = "https://api.twitter.com/2/tweets/search/recent"
+QUERY_MAX_LENGTH = int(os.getenv("TWITTER_QUERY_MAX_LENGTH", 512))  # 1024 on Pro
+QUERY_FILTERS = "-is:retweet -is:reply lang:en"
+
 # ---------------------------
-# Supabase setup
+# High-water marks
 # ---------------------------
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _redis():
+    try:
+        return sync_client()
+    except Exception as e:
+        print(f"[Twitter] Redis unavailable ({e}); using {SINCE_ID_FILE}")
+        return None
+
+def _load_local_state():
+    if os.path.exists(SINCE_ID_FILE):
+        with open(SINCE_ID_FILE, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+    return {}
+
+def _parse_mark(value):
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    if str(value).startswith("{"):
+        return json.loads(value)
+    return {"since_id": int(value)}  # bare id written by earlier versions
+
+def get_marks(keywords):
+    """{keyword: mark} for the given keywords ({} when a keyword has none)."""
+    keywords = list(keywords)
+    if not keywords:
+        return {}
+    r = _redis()
+    if r is not None:
+        values = r.hmget(SINCE_ID_KEY, keywords)
+    else:
+        with _state_lock:
+            state = _load_local_state()
+        values = [state.get(kw) for kw in keywords]
+    return {kw: _parse_mark(value) for kw, value in zip(keywords, values)}
+
+def set_marks(marks):
+    """Store marks ({keyword: mark}) computed by advance_mark."""
+    marks = {kw: mark for kw, mark in marks.items() if mark}
+    if not marks:
+        return
+    r = _redis()
+    if r is not None:
+        r.hset(SINCE_ID_KEY, mapping={kw: json.dumps(mark) for kw, mark in marks.items()})
+        return
+    with _state_lock:
+        state = _load_local_state()
+        state.update(marks)
+        tmp = SINCE_ID_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, SINCE_ID_FILE)
+
+TWITTER_EPOCH_MS = 1288834974657
+SEARCH_WINDOW_SECONDS = 7 * 24 * 3600 - 3600  # recent search covers 7 days; keep an hour of margin
+
+def is_stale(mark, now=None):
+    """True when a mark's since_id is older than recent search accepts (ids are snowflakes)."""
+    since = mark.get("since_id")
+    if not since:
+        return False
+    created = ((int(since) >> 22) + TWITTER_EPOCH_MS) / 1000
+    return (now or time.time()) - created > SEARCH_WINDOW_SECONDS
+
+def live_marks(marks):
+    """Drop stale marks up front so they never cost a 400 (the keyword restarts from recent)."""
+    return {kw: ({} if is_stale(mark) else mark) for kw, mark in marks.items()}
+
+def advance_mark(mark, newest_id, oldest_id, complete):
+    """
+    Next mark after fetching a keyword's window newest-first. A finished
+    window moves since_id to the newest tweet seen (or to the pending
+    newest_id when the window was a gap); an unfinished one keeps since_id
+    and records until_id so nothing between them is skipped.
+    """
+    since, until, pending = mark.get("since_id"), mark.get("until_id"), mark.get("newest_id")
+    newest = int(newest_id) if newest_id else None
+    oldest = int(oldest_id) if oldest_id else None
+    if not complete and (oldest is None or (since and oldest <= since)):
+        complete = True  # a shared window may reach past this keyword's own since_id
+    if complete:
+        target = pending if until else (newest or since)
+        return {"since_id": target} if target else {}
+    if not since:
+        # New keyword: no backlog is owed, start from what was seen
+        return {"since_id": newest} if newest else {}
+    return {
+        "since_id": since,
+        "until_id": min(until, oldest) if until else oldest,
+        "newest_id": pending if until else newest,
+    }
 
 # ---------------------------
 # Functions
 # ---------------------------
-def search_tweets(keyword, max_results=50):
+@retryable(max_attempts=3, base_delay=2, deadline=60, on_retry=log_retry)
+def _fetch_new_pages(query, budget, since_id=None, until_id=None):
+    """Pages of tweets in (since_id, until_id), newest first, up to budget tweets."""
+    page_size = max(10, min(PAGE_SIZE, budget))
+    kwargs = {k: v for k, v in (("since_id", since_id), ("until_id", until_id)) if v}
+    return list(tweepy.Paginator(
+        client.search_recent_tweets,
+        query=query,
+        max_results=page_size,
+        tweet_fields=["public_metrics", "created_at", "author_id"],
+        expansions=["author_id"],
+        limit=-(-budget // page_size),
+        **kwargs,
+    ))
+
+def fetch_new_tweets(keyword, max_results=TWEET_BUDGET):
     """
-    Search recent tweets for a keyword, normalize engagement by followers.
-    Returns list of tweet dicts.
+    Fetch a keyword's tweets posted since its high-water mark (up to
+    max_results), normalize engagement by followers. Returns (tweets,
+    marks); pass marks to save_tweets_to_supabase so the mark only moves
+    once the tweets are stored.
     """
     tweets_data = []
+    query = keyword + " -is:retweet -is:reply lang:en"
+    mark = live_marks(get_marks([keyword]))[keyword]
     try:
-        response = client.search_recent_tweets(
-            query=keyword + " -is:retweet -is:reply lang:en",
-            max_results=max_results,
-            tweet_fields=["public_metrics", "created_at", "author_id"],
-            expansions=["author_id"],
-        )
-        if not response.data:
-            return []
+        try:
+            pages = _fetch_new_pages(query, max_results, mark.get("since_id"), mark.get("until_id"))
+        except tweepy.BadRequest:
+            if not mark.get("since_id"):
+                raise
+            # since_id older than the 7-day search window: start over from recent
+            mark = {}
+            pages = _fetch_new_pages(query, max_results)
+    except Exception as e:
+        print(f"[Twitter Error] {e}")
+        return [], {}
 
-        users = {u.id: u for u in response.includes['users']}
+    for response in pages:
+        if not response.data:
+            continue
+        users = {u.id: u for u in response.includes.get('users', [])}
 
         for tweet in response.data:
             user = users.get(tweet.author_id)
@@ -66,23 +207,239 @@ def search_tweets(keyword, max_results=50):
                 "engagement_norm": engagement,
                 "keyword": keyword,
             })
-    except Exception as e:
-        print(f"[Twitter Error] {e}")
 
-    return tweets_data
+    metas = [response.meta or {} for response in pages]
+    complete = not metas or not metas[-1].get("next_token")
+    newest = next((m.get("newest_id") for m in metas if m.get("newest_id")), None)
+    oldest = next((m.get("oldest_id") for m in reversed(metas) if m.get("oldest_id")), None)
+    return tweets_data, {keyword: advance_mark(mark, newest, oldest, complete)}
 
-def save_tweets_to_supabase(tweets, table_name="tweets"):
+def search_tweets(keyword, max_results=TWEET_BUDGET):
+    """New tweets for a keyword (see fetch_new_tweets); does not move its mark."""
+    return fetch_new_tweets(keyword, max_results)[0]
+
+# ---------------------------
+# Batched multi-keyword search (async)
+# ---------------------------
+def _keyword_clause(keyword):
+    keyword = keyword.strip().replace('"', '')
+    return f'"{keyword}"' if " " in keyword else keyword
+
+def build_query(keywords):
+    return "(" + " OR ".join(_keyword_clause(kw) for kw in keywords) + ") " + QUERY_FILTERS
+
+def plan_queries(keywords, max_length=QUERY_MAX_LENGTH):
     """
-    Save a list of tweet dicts to Supabase table.
+    Pack keywords into as few OR-joined queries as fit max_length.
+    Returns a list of keyword groups, one request each.
+    """
+    groups, current = [], []
+    for kw in dict.fromkeys(k for k in keywords if k.strip()):
+        if current and len(build_query(current + [kw])) > max_length:
+            groups.append(current)
+            current = []
+        current.append(kw)
+    if current:
+        groups.append(current)
+    return groups
+
+def match_keywords(text, keywords):
+    """Keywords of a batch that a tweet's text matches (case-insensitive)."""
+    lowered = text.lower()
+    matched = [kw for kw in keywords
+               if re.search(r"(?<!\w)" + re.escape(kw.lower()) + r"(?!\w)", lowered)]
+    # The API also matches inside URLs, hashtags and cashtags
+    return matched or [kw for kw in keywords if kw.lower() in lowered]
+
+def plan_groups(marks, max_length=QUERY_MAX_LENGTH):
+    """
+    plan_queries per kind of mark, so one new keyword never drops the
+    since_id of the keywords it is packed with.
+    """
+    kinds = {"new": [], "marked": [], "gap": []}
+    for kw, mark in marks.items():
+        kind = "gap" if mark.get("until_id") else "marked" if mark.get("since_id") else "new"
+        kinds[kind].append(kw)
+    return [group for kws in kinds.values() for group in plan_queries(kws, max_length)]
+
+def group_window(group, marks):
+    """since_id/until_id params covering every keyword of a group."""
+    since_ids = [marks[kw].get("since_id") for kw in group]
+    until_ids = [marks[kw].get("until_id") for kw in group]
+    window = {}
+    if all(since_ids):
+        window["since_id"] = min(since_ids)
+    if all(until_ids):
+        window["until_id"] = max(until_ids)
+    return window
+
+_async_client: httpx.AsyncClient = None
+
+def _get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=20,
+            headers={"Authorization": f"Bearer {BEARER_TOKEN}"},
+        )
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+def _rate_budget(response, budget=None):
+    """Remaining requests in the current 15-minute window, from x-rate-limit-* headers."""
+    budget = dict(budget or {})
+    headers = response.headers
+    for field in ("limit", "remaining", "reset"):
+        value = headers.get(f"x-rate-limit-{field}")
+        if value is not None:
+            budget[field] = int(value)
+    return budget
+
+def _normalize(tweet, user, keyword):
+    metrics = tweet["public_metrics"]
+    follower_count = user.get("public_metrics", {}).get("followers_count", 1) or 1
+    engagement = (metrics['like_count'] + metrics['retweet_count'] + metrics['reply_count']) / follower_count
+    return {
+        "tweet_id": int(tweet["id"]),
+        "text": tweet["text"],
+        "author_id": int(tweet["author_id"]),
+        "created_at": tweet["created_at"],
+        "like_count": metrics['like_count'],
+        "retweet_count": metrics['retweet_count'],
+        "reply_count": metrics['reply_count'],
+        "followers_count": follower_count,
+        "engagement_norm": engagement,
+        "keyword": keyword,
+    }
+
+async def _search_page(params):
+    response = await _get_async_client().get(SEARCH_URL, params=params)
+    response.raise_for_status()
+    return response
+
+async def _fetch_window(params, max_results, result):
+    """
+    Page through one query, newest first, until max_results tweets, the end
+    of the window or the end of the rate window. Returns the response bodies.
+    """
+    params, pages, fetched = dict(params), [], 0
+    while fetched < max_results:
+        response = await retry_async(
+            _search_page, (params,), max_attempts=3, base_delay=2, deadline=60,
+            retry_on=lambda e: is_retryable(e) and get_status(e) != 429,
+            on_retry=log_retry, name="twitter.search_recent")
+        result["rate"] = _rate_budget(response, result["rate"])
+        body = response.json()
+        pages.append(body)
+        fetched += len(body.get("data", []))
+
+        next_token = body.get("meta", {}).get("next_token")
+        if not next_token or result["rate"].get("remaining") == 0:
+            break
+        params["next_token"] = next_token
+    return pages
+
+async def search_keywords(keywords, max_results=TWEET_BUDGET, max_length=QUERY_MAX_LENGTH):
+    """
+    Search many keywords with as few requests as possible. Keywords are
+    packed into OR-joined queries (new keywords, keywords with a mark and
+    keywords with an unfinished gap are packed separately), only tweets
+    newer than the group's oldest since_id are fetched (up to max_results
+    per query) and each tweet is routed back to the keywords it matches.
+
+    Never sleeps on the rate limit: once the window is spent the remaining
+    groups are returned in "skipped" for the next cycle.
+
+    Returns {"tweets": [dict], "by_keyword": {kw: [dict]}, "marks": {kw: mark},
+    "rate": {"limit", "remaining", "reset"}, "skipped": [kw]}.
+    """
+    result = {"tweets": [], "by_keyword": {kw: [] for kw in keywords},
+              "marks": {}, "rate": {}, "skipped": []}
+    seen = set()
+    marks = live_marks(await asyncio.to_thread(get_marks, keywords))
+    groups = plan_groups(marks, max_length)
+
+    for index, group in enumerate(groups):
+        if result["rate"].get("remaining") == 0:
+            result["skipped"] = [kw for g in groups[index:] for kw in g]
+            break
+
+        base_params = {
+            "query": build_query(group),
+            "max_results": max(10, min(PAGE_SIZE, max_results)),
+            "tweet.fields": "public_metrics,created_at,author_id",
+            "expansions": "author_id",
+            "user.fields": "public_metrics",
+        }
+        window = group_window(group, marks)
+        group_marks = {kw: marks[kw] for kw in group}
+
+        try:
+            try:
+                pages = await _fetch_window(dict(base_params, **window), max_results, result)
+            except httpx.HTTPStatusError as e:
+                if get_status(e) != 400 or "since_id" not in window:
+                    raise
+                # since_id older than the 7-day search window: refetch as new keywords,
+                # the new marks replace the stale ones
+                print(f"[Twitter] Stale since_id for {group}; refetching recent tweets")
+                group_marks = {kw: {} for kw in group}
+                pages = await _fetch_window(base_params, max_results, result)
+        except httpx.HTTPStatusError as e:
+            if get_status(e) == 429:
+                result["rate"] = _rate_budget(e.response, result["rate"])
+                result["rate"]["remaining"] = 0
+                result["skipped"] = [kw for g in groups[index:] for kw in g]
+                break
+            print(f"[Twitter Error] {e}")
+            continue
+
+        for body in pages:
+            users = {u["id"]: u for u in body.get("includes", {}).get("users", [])}
+            for tweet in body.get("data", []):
+                user = users.get(tweet["author_id"])
+                matched = match_keywords(tweet["text"], group)
+                if not user or not matched:
+                    continue
+                row = _normalize(tweet, user, matched[0])
+                for kw in matched:
+                    result["by_keyword"][kw].append(row)
+                if row["tweet_id"] not in seen:
+                    seen.add(row["tweet_id"])
+                    result["tweets"].append(row)
+
+        # Marks only move past what was actually paged through
+        metas = [body.get("meta", {}) for body in pages]
+        complete = not metas or not metas[-1].get("next_token")
+        newest = next((m.get("newest_id") for m in metas if m.get("newest_id")), None)
+        oldest = next((m.get("oldest_id") for m in reversed(metas) if m.get("oldest_id")), None)
+        for kw, mark in group_marks.items():
+            result["marks"][kw] = advance_mark(mark, newest, oldest, complete)
+
+    return result
+
+def save_tweets_to_supabase(tweets, table_name="tweets", marks=None):
+    """
+    Upsert a list of tweet dicts to Supabase table (idempotent on tweet_id).
+    marks (from fetch_new_tweets / search_keywords) are stored for every
+    keyword whose tweets were all written.
     """
     if not tweets:
+        set_marks(marks or {})
         return 0
     try:
-        response = supabase.table(table_name).insert(tweets).execute()
-        if response.error:
-            print(f"[Supabase Error] {response.error}")
-            return 0
-        return len(tweets)
+        result = bulk_upsert(table_name, tweets, on_conflict="tweet_id")
+        if result["failed"]:
+            print(f"[Supabase Error] {len(result['failed'])} tweets not saved: {result['errors'][0]}")
+
+        failed_keywords = {row.get("keyword") for row in result["failed"]}
+        set_marks({kw: mark for kw, mark in (marks or {}).items() if kw not in failed_keywords})
+        return result["written"]
     except Exception as e:
         print(f"[Supabase Exception] {e}")
         return 0
@@ -105,8 +462,8 @@ def run_three_times_daily():
         nonlocal last_index
         keyword = rotate_keywords(index=last_index)
         print(f"Searching Twitter for keyword: {keyword}")
-        tweets = search_tweets(keyword)
-        saved_count = save_tweets_to_supabase(tweets)
+        tweets, marks = fetch_new_tweets(keyword)
+        saved_count = save_tweets_to_supabase(tweets, marks=marks)
         print(f"Fetched {len(tweets)} tweets, saved {saved_count} to Supabase")
         last_index += 1
 
@@ -0,0 +1,57 @@
+# vector_index.py
+"""
+Cosine-similarity index over normalized float32 embeddings.
+
+An exact NumPy matrix product. The index is rebuilt from the dedup window
+on every save and only answers a few dozen queries, so building an ANN
+graph (FAISS/HNSW) would cost far more than the product it replaces.
+"""
+
+import numpy as np
+
+
+def to_blob(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def from_blobs(blobs, dim):
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), dim)
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class VectorIndex:
+    """Max cosine similarity of query vectors against a fixed set of vectors."""
+
+    def __init__(self, vectors, dim):
+        self.dim = dim
+        self.vectors = normalize(vectors) if len(vectors) else np.empty((0, dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def max_similarity(self, queries):
+        """Best cosine similarity for each query row (-1 when the index is empty)."""
+        queries = normalize(queries)
+        if len(queries) == 0 or len(self.vectors) == 0:
+            return np.full(len(queries), -1.0, dtype=np.float32)
+        return (queries @ self.vectors.T).max(axis=1)
+
+
+def dedup_within_batch(vectors, threshold):
+    """
+    Greedy in-batch dedup: keep a row unless it is more similar than
+    threshold to an earlier kept row. Returns a boolean keep mask.
+    """
+    vectors = normalize(vectors)
+    sims = vectors @ vectors.T
+    keep = np.ones(len(vectors), dtype=bool)
+    for i in range(1, len(vectors)):
+        earlier = keep[:i]
+        if earlier.any() and sims[i, :i][earlier].max() > threshold:
+            keep[i] = False
+    return keep